@@ -12,11 +12,19 @@ from .log import config_log
 from app.campus.controller import api as campus_api
 from app.course.controller import api as course_api
 from app.order.controller import api as order_api
+from app.report.controller import api as report_api
 from app.health.controller import api as health_api
 from app.user.controller import auth_api,users_api,students_api,teachers_api,admins_api
 
 from app.user import register_user_lookup
 from app.core.convertor import CustomEncoder
+from app.core.storage import config_storage
+from app.core.cache import config_cache
+from app.core.response_cache import config_response_cache
+from app.core.pool import config_pool
+from app.core.metrics import config_metrics
+from app.core.s3_cleanup import config_s3_cleanup
+from app.core.indexes import config_indexes
 from app.exceptions import register_resources_exception_handler
 
 load_dotenv("./.env")
@@ -31,6 +39,7 @@ api.add_namespace(students_api)
 api.add_namespace(teachers_api)
 api.add_namespace(course_api)
 api.add_namespace(order_api)
+api.add_namespace(report_api)
 api.add_namespace(admins_api)
 api.add_namespace(health_api)
 
@@ -46,12 +55,29 @@ def create_app():
     #log config
     config_log(app)
 
+    #shared cache stamps, response cache and S3 signed url cache
+    config_cache(app)
+    config_response_cache(app)
+    config_storage(app)
+
+    #bcrypt threadpool
+    config_pool(app)
+
+    #latency histograms and mongo/s3/bcrypt counters, before the mongo client exists
+    config_metrics(app)
+
     #config MongoEngine
     MongoEngine(app)
 
+    #declared indexes are built in the background on worker boot
+    config_indexes(app)
+
+    #S3 cleanup settings; wsgi.py and server.py start the worker loop
+    config_s3_cleanup(app)
+
     #JWT
     jwt=JWTManager(app)
-    register_user_lookup(jwt=jwt)
+    register_user_lookup(jwt=jwt, app=app)
 
     #config CORS
     CORS(app)
@@ -5,16 +5,21 @@ from app.exceptions.database_exceptions import DuplicateRecord
 from .model import Campus
 from .schema import CampusListSchema, CampusSchema
 from app.user import permission_required
-from app.campus.service import campus_service
+from app.campus.service import campus_service, unauthorized_campus_service
+from app.core.response_cache import cached_response
 
 api = Namespace("campus")
 
 @api.route("")
 class CampusListApi(Resource):
     def get(self):
-        campus_list = list(Campus.objects())
-        print(campus_list)
-        return CampusListSchema.from_orm(campus_list)
+        service = unauthorized_campus_service()
+        return cached_response(
+            "campus",
+            "list",
+            lambda: CampusListSchema.from_orm(service.list_campuses()),
+            etag=service.campus_list_etag,
+        )
     
     @permission_required("campus_admin")
     def post(self):
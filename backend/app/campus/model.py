@@ -1,5 +1,11 @@
 from flask_mongoengine import Document
-from mongoengine import StringField
+from mongoengine import IntField, StringField
 
 class Campus(Document):
-    name=StringField(required=True,max_length=200)
\ No newline at end of file
+    name=StringField(required=True,max_length=200)
+    version=IntField(default=0)
+
+    meta={
+        "index_background":True,
+        "indexes":["name"],
+        }
\ No newline at end of file
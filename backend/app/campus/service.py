@@ -1,5 +1,7 @@
 
 from flask_jwt_extended import get_current_user
+from app.core.etag import make_etag
+from app.core.response_cache import response_cache
 from app.core.service import BaseService
 from app.campus.model import Campus
 from mongoengine.errors import NotUniqueError
@@ -13,9 +15,26 @@ class CampusService(BaseService):
     def register_campus(self,campus:Campus):
         try:
             campus.save()
+            response_cache.invalidate("campus")
             return campus
         except NotUniqueError:
             raise DuplicateRecord("Campus already exists")
-        
+
+    def list_campuses(self):
+        return list(Campus.objects())
+
+    def campus_list_etag(self) -> str:
+        return make_etag(
+            "campus",
+            *(
+                f"{campus['_id']}:{campus.get('version', 0)}"
+                for campus in Campus.objects.only("version").order_by("id").as_pymongo()
+            ),
+        )
+
+
 def campus_service():
-    return CampusService(get_current_user())
\ No newline at end of file
+    return CampusService(get_current_user())
+
+def unauthorized_campus_service():
+    return CampusService(None)
\ No newline at end of file
@@ -0,0 +1,255 @@
+import glob
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """Bounded LRU mapping whose entries expire ``ttl`` seconds after insertion."""
+
+    def __init__(self, maxsize=1024, ttl=60) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def configure(self, maxsize=None, ttl=None):
+        with self._lock:
+            if maxsize is not None:
+                self.maxsize = maxsize
+            if ttl is not None:
+                self.ttl = ttl
+            self._data.clear()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._data.pop(key, None)
+            return default if entry is None else entry[1]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+        }
+
+
+class FileCache:
+    """``TTLCache`` counterpart kept as JSON files under ``path``.
+
+    Every worker process on the host reads the same entries, so a value built
+    by one worker is served by all of them. Values must be JSON serializable.
+    """
+
+    PRUNE_EVERY = 256
+
+    def __init__(self, path, ttl=60) -> None:
+        self.path = path
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._sets = 0
+
+    def configure(self, path=None, ttl=None):
+        if path:
+            self.path = path
+        if ttl is not None:
+            self.ttl = ttl
+
+    def _entries(self):
+        # entry names are 40 hex chars; in-flight ``.tmp`` files never match
+        return glob.glob(os.path.join(self.path, "?" * 40))
+
+    def _entry(self, key):
+        return os.path.join(self.path, hashlib.sha1(repr(key).encode("utf-8")).hexdigest())
+
+    def get(self, key, default=None):
+        try:
+            with open(self._entry(key)) as f:
+                expires_at, value = json.load(f)
+        except (OSError, ValueError):
+            self.misses += 1
+            return default
+        if expires_at <= time.time():
+            self.misses += 1
+            return default
+        self.hits += 1
+        return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        os.makedirs(self.path, exist_ok=True)
+        target = self._entry(key)
+        tmp = f"{target}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump([expires_at, value], f)
+        os.replace(tmp, target)
+        self._sets += 1
+        if self._sets % self.PRUNE_EVERY == 0:
+            self.prune()
+
+    def pop(self, key, default=None):
+        value = self.get(key, default)
+        try:
+            os.remove(self._entry(key))
+        except FileNotFoundError:
+            pass
+        return value
+
+    def prune(self):
+        """Remove expired entries left behind by superseded keys"""
+        now = time.time()
+        for entry in self._entries():
+            try:
+                with open(entry) as f:
+                    expires_at, _ = json.load(f)
+                if expires_at <= now:
+                    os.remove(entry)
+            except (OSError, ValueError):
+                continue
+
+    def clear(self):
+        for entry in self._entries():
+            try:
+                os.remove(entry)
+            except OSError:
+                pass
+
+    def __len__(self):
+        return len(self._entries())
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "size": len(self), "ttl": self.ttl}
+
+
+class SingleFlight:
+    """Coalesces concurrent calls that share a key into one execution.
+
+    The first caller runs ``func``; callers arriving while it is in flight
+    wait for it and get the same result or exception. Under a gevent worker
+    the lock and event are cooperative, so waiting greenlets yield.
+    """
+
+    class _Call:
+        def __init__(self) -> None:
+            self.done = threading.Event()
+            self.result = None
+            self.error = None
+            self.traceback = None
+
+    def __init__(self) -> None:
+        self.coalesced = 0
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, func):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = self._Call()
+            else:
+                self.coalesced += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                # restart from the leader's traceback so waiters don't grow it
+                raise call.error.with_traceback(call.traceback)
+            return call.result
+        try:
+            call.result = func()
+        except BaseException as error:
+            call.error = error
+            call.traceback = error.__traceback__
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def __len__(self):
+        return len(self._calls)
+
+
+class SharedVersions:
+    """Per-key version stamps shared by every worker process on the host.
+
+    A key's version is the mtime of a marker file under ``path``. Bumping a
+    key touches that file, so the other gunicorn workers notice the change
+    with a single ``stat()`` instead of a database round trip.
+    """
+
+    def __init__(self, path=None) -> None:
+        self.path = path or os.path.join(tempfile.gettempdir(), "app-shared-cache")
+
+    def configure(self, path=None):
+        if path:
+            self.path = path
+        os.makedirs(self.path, exist_ok=True)
+
+    def _marker(self, key):
+        return os.path.join(self.path, hashlib.sha1(str(key).encode("utf-8")).hexdigest())
+
+    def version(self, key) -> int:
+        try:
+            return os.stat(self._marker(key)).st_mtime_ns
+        except FileNotFoundError:
+            return 0
+
+    def bump(self, key) -> int:
+        marker = self._marker(key)
+        current = self.version(key)
+        if current == 0:
+            os.makedirs(self.path, exist_ok=True)
+            open(marker, "a").close()
+        version = max(time.time_ns(), current + 1)
+        os.utime(marker, ns=(version, version))
+        return version
+
+
+shared_versions = SharedVersions()
+
+
+def config_cache(app):
+    shared_versions.configure(app.config.get("SHARED_CACHE_DIR"))
+    return app
@@ -1,22 +1,172 @@
 import datetime
 import json
+from functools import lru_cache
 
-from pydantic import BaseModel,SecretStr
+from bson import ObjectId
+from pydantic import BaseModel,SecretStr,ValidationError
+from pydantic.class_validators import make_generic_validator
+from pydantic.error_wrappers import ErrorWrapper
+from pydantic.errors import MissingError, NoneIsNotAllowedError
+from pydantic.fields import SHAPE_LIST, SHAPE_SINGLETON
 from uuid import UUID
 
+try:
+    import orjson
+except ImportError:  # optional; the stdlib encoder is used without it
+    orjson = None
+
+
+def encode_default(obj):
+    if isinstance(obj,datetime.datetime):
+        return obj.isoformat()
+    if isinstance(obj,SecretStr):
+        return None
+    if isinstance(obj,BaseModel):
+        return obj.dict(exclude_defaults=True)
+    if isinstance(obj,(UUID,ObjectId)):
+        return str(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
 class CustomEncoder(json.JSONEncoder):
     def default(self,obj):
-        if isinstance(obj,datetime.datetime):
-            return obj.isoformat()
-        if isinstance(obj,SecretStr):
-            return None
-        if isinstance(obj,BaseModel):
-            return obj.dict(exclude_defaults=True)
-        if isinstance(obj, UUID):
-            return str(obj)
-        else:
+        try:
+            return encode_default(obj)
+        except TypeError:
             return super().default(obj)
 
+    def encode(self, obj):
+        # orjson has no arbitrary indent or key sorting; those (debug) cases keep the stdlib path
+        if orjson is not None and self.indent is None and not self.sort_keys:
+            try:
+                return orjson.dumps(obj, default=encode_default).decode("utf-8")
+            except TypeError:
+                pass
+        return super().encode(obj)
+
+
+def _object_id(v):
+    if isinstance(v, ObjectId):
+        return str(v)
+    if isinstance(v, str):
+        return v
+    return str(v.id)
+
+
+def _plain(field):
+    if field.type_ is SecretStr:
+        return lambda v: None
+    if field.type_ is float:
+        return lambda v: float(v) if isinstance(v, int) and not isinstance(v, bool) else v
+    if isinstance(field.type_, type) and issubclass(field.type_, str) and field.type_ is not str:
+        return _object_id
+    return None
+
+
+def _field_serializer(schema, field):
+    if isinstance(field.type_, type) and issubclass(field.type_, BaseModel):
+        convert = compile_serializer(field.type_)
+    else:
+        convert = _plain(field)
+    if convert is None and not field.class_validators:
+        return None
+
+    validators = [
+        (make_generic_validator(validator.func), validator.pre, validator.each_item)
+        for validator in field.class_validators.values()
+    ]
+
+    def run(value, values, pre, each_item):
+        for validator, is_pre, is_each_item in validators:
+            if is_pre == pre and is_each_item == each_item:
+                value = validator(schema, value, values, field, schema.__config__)
+        return value
+
+    def one(value, values):
+        value = run(value, values, True, field.shape != SHAPE_SINGLETON)
+        if value is not None and convert is not None:
+            value = convert(value)
+        return run(value, values, False, field.shape != SHAPE_SINGLETON)
+
+    if field.shape == SHAPE_SINGLETON:
+        return one
+
+    def many(value, values):
+        value = run(value, values, True, False)
+        if value is not None:
+            value = [one(item, values) for item in value]
+        return run(value, values, False, False)
+
+    return many
+
+
+_MISSING = object()
+
+
+@lru_cache(maxsize=None)
+def compile_serializer(schema):
+    """Render a trusted database object like ``schema.from_orm(obj).dict(exclude_defaults=True)``.
+
+    The per-field work (aliases, nested schemas, validators, defaults) is
+    resolved once per schema. Values are not type checked, but a missing or
+    None required value raises the same ``ValidationError`` as ``from_orm``.
+    Schemas it cannot model fall back to ``from_orm``.
+    """
+    if schema.__pre_root_validators__ or schema.__post_root_validators__ or any(
+        field.shape not in (SHAPE_SINGLETON, SHAPE_LIST) for field in schema.__fields__.values()
+    ):
+        return lambda obj: schema.from_orm(obj).dict(exclude_defaults=True)
+
+    fields = [
+        (
+            name,
+            field.alias,
+            field.required,
+            # a pre validator may still turn None into a value
+            not field.allow_none and not field.pre_validators and not any(
+                validator.pre for validator in field.class_validators.values()
+            ),
+            field.default,
+            _field_serializer(schema, field),
+        )
+        for name, field in schema.__fields__.items()
+    ]
+
+    def serialize(obj):
+        values = {}
+        errors = []
+        get = obj.get if isinstance(obj, dict) else lambda key, default: getattr(obj, key, default)
+        for name, alias, required, not_none, default, convert in fields:
+            value = get(alias, _MISSING)
+            if value is _MISSING:
+                if required:
+                    errors.append(ErrorWrapper(MissingError(), loc=alias))
+                continue
+            if value is None and not_none:
+                errors.append(ErrorWrapper(NoneIsNotAllowedError(), loc=alias))
+                continue
+            if not required and value == default:
+                continue
+            if convert is not None:
+                value = convert(value, values)
+            elif type(value) is not list and isinstance(value, list):
+                value = list(value)
+            values[name] = value
+        if errors:
+            raise ValidationError(errors, schema)
+        return values
+
+    return serialize
+
+
+def serialize(schema, obj):
+    return compile_serializer(schema)(obj)
+
+
+def serialize_many(schema, objs):
+    convert = compile_serializer(schema)
+    return [convert(obj) for obj in objs]
+
 def prepare_reference_fields(update_dict, field_mappings):
     result = update_dict.copy()
     
@@ -0,0 +1,25 @@
+import hashlib
+
+from flask import Response, request
+from werkzeug.http import quote_etag
+
+
+def make_etag(*parts) -> str:
+    return hashlib.sha1("|".join(str(part) for part in parts).encode("utf-8")).hexdigest()
+
+
+def conditional_response(etag, build):
+    """Answer ``304 Not Modified`` when the client already holds ``etag``.
+
+    ``etag`` should come from a cheap projection of ``version`` fields, so the
+    full document is only loaded and serialized by ``build()`` on a miss. The
+    tag is weak: signed URLs inside an unchanged body differ between workers.
+    """
+    headers = {"ETag": quote_etag(etag, weak=True), "Cache-Control": "private, no-cache"}
+    if request.if_none_match.contains_weak(etag):
+        return Response(status=304, headers=headers)
+    body = build()
+    if isinstance(body, Response):
+        body.headers.update(headers)
+        return body
+    return body, 200, headers
@@ -0,0 +1,91 @@
+import csv
+import datetime
+import io
+import json
+
+from bson import ObjectId
+from flask import Response, stream_with_context
+from werkzeug.exceptions import BadRequest
+
+EXPORT_BATCH_SIZE = 1000
+EXPORT_FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+
+def _lookup(document, path):
+    for part in path.split("."):
+        if not isinstance(document, dict):
+            return None
+        document = document.get(part)
+    return document
+
+
+def _export_value(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if isinstance(value, ObjectId):
+        return str(value)
+    return value
+
+
+def export_rows(query_set, columns, batch_size=EXPORT_BATCH_SIZE, converters=None):
+    """Yield one dict per document; ``columns`` maps output names to raw (dotted) field paths.
+
+    ``converters`` optionally maps an output name to a function applied to its raw value.
+
+    Only the top-level fields behind ``columns`` are fetched, and the cursor
+    is read ``batch_size`` documents at a time without caching them.
+    """
+    fields = {path.split(".")[0] for path in columns.values()}
+    only = ["id" if field == "_id" else field for field in fields]
+    cursor = query_set.only(*only).as_pymongo().no_cache().batch_size(batch_size)
+    converters = converters or {}
+    for document in cursor:
+        row = {}
+        for name, path in columns.items():
+            value = _lookup(document, path)
+            if name in converters and value is not None:
+                value = converters[name](value)
+            row[name] = _export_value(value)
+        yield row
+
+
+def _csv_chunks(rows, columns, batch_size):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for count, row in enumerate(rows, 1):
+        writer.writerow(["" if value is None else value for value in row.values()])
+        if count % batch_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def _ndjson_chunks(rows, batch_size):
+    lines = []
+    for row in rows:
+        lines.append(json.dumps(row))
+        if len(lines) == batch_size:
+            yield "\n".join(lines) + "\n"
+            lines = []
+    if lines:
+        yield "\n".join(lines) + "\n"
+
+
+def stream_export(
+    query_set, columns, export_format, filename, batch_size=EXPORT_BATCH_SIZE, converters=None
+):
+    """Stream ``query_set`` as a CSV or NDJSON attachment, one chunk per ``batch_size`` rows"""
+    if export_format not in EXPORT_FORMATS:
+        raise BadRequest(f"Export format must be one of: {', '.join(EXPORT_FORMATS)}")
+    rows = export_rows(query_set, columns, batch_size, converters)
+    if export_format == "csv":
+        chunks = _csv_chunks(rows, columns, batch_size)
+    else:
+        chunks = _ndjson_chunks(rows, batch_size)
+    return Response(
+        stream_with_context(chunks),
+        mimetype=EXPORT_FORMATS[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{export_format}"'},
+    )
@@ -0,0 +1,95 @@
+import uuid
+
+from bson import ObjectId
+from mongoengine import Document
+from mongoengine.base import _document_registry
+
+from app.core.pool import spawn_background
+
+
+def indexed_documents():
+    """Concrete Document classes, one per collection"""
+    documents = {}
+    for document in _document_registry.values():
+        if not issubclass(document, Document) or document._meta.get("abstract"):
+            continue
+        # the root of an inheritance tree also ensures its subclasses' indexes
+        current = documents.get(document._get_collection_name())
+        if current is None or len(document._superclasses) < len(current._superclasses):
+            documents[document._get_collection_name()] = document
+    return sorted(documents.values(), key=lambda document: document.__name__)
+
+
+def ensure_indexes(logger=None):
+    """Create every declared index; createIndexes is a no-op for indexes that already exist"""
+    for document in indexed_documents():
+        document.ensure_indexes()
+        if logger is not None:
+            logger.info(f"Indexes ensured for {document._get_collection_name()}")
+
+
+def index_probes():
+    """Representative filters and sorts issued by the services, keyed by a readable name"""
+    from app.campus.model import Campus
+    from app.core.s3_cleanup import PendingS3Deletion
+    from app.course.model import Course
+    from app.enrollment.model import Enrollment
+    from app.order.model import Order
+    from app.report.model import OrderRollup
+    from app.user.model import User
+
+    object_id = ObjectId()
+    return {
+        "campus by name": Campus.objects(name="probe"),
+        "user by username": User.objects(username="probe"),
+        "users by type and campus": User.objects(_cls="User.Student", campus=object_id),
+        "campus users page": User.objects(campus=object_id).order_by("created_at", "id"),
+        "courses by teacher": Course.objects(teacher=object_id),
+        "courses by campus": Course.objects(campus=object_id),
+        "course lecture lookup": Course.objects(lectures__id=uuid.uuid4()),
+        "enrollments by student": Enrollment.objects(student=object_id),
+        "course roster page": Enrollment.objects(course=object_id).order_by("student"),
+        "student orders": Order.objects(student=object_id).order_by("-created_time"),
+        "student paid orders": Order.objects(student=object_id, paid=True),
+        "course orders": Order.objects(course=object_id).order_by("-created_time"),
+        "campus orders": Order.objects(campus=object_id).order_by("-created_time"),
+        "campus paid orders": Order.objects(campus=object_id, paid=True).order_by("-created_time"),
+        "unpaid orders": Order.objects(paid=False).order_by("-created_time"),
+        "all orders newest first": Order.objects.order_by("-created_time"),
+        "order rollups by day": OrderRollup.objects(dimension="day", key__gte="2020-01-01").order_by("key"),
+        "due S3 deletions": PendingS3Deletion.objects(next_attempt_at__lte=object_id.generation_time),
+    }
+
+
+def _plan_stages(plan):
+    yield plan.get("stage")
+    for key in ("inputStage", "queryPlan"):
+        if key in plan:
+            yield from _plan_stages(plan[key])
+    for child in plan.get("inputStages", []):
+        yield from _plan_stages(child)
+
+
+def find_collscans(probes=None):
+    """Names of the probes whose winning plan contains a COLLSCAN"""
+    collscans = []
+    for name, query_set in (probes or index_probes()).items():
+        winning_plan = query_set.explain()["queryPlanner"]["winningPlan"]
+        if "COLLSCAN" in _plan_stages(winning_plan):
+            collscans.append(name)
+    return collscans
+
+
+def config_indexes(app):
+    """Build declared indexes in the background when a worker boots (ENSURE_INDEXES_ON_BOOT)"""
+    if app.config.get("ENSURE_INDEXES_ON_BOOT", True):
+        logger = app.logger
+
+        def run():
+            try:
+                ensure_indexes(logger)
+            except Exception:
+                logger.exception("Ensuring indexes failed")
+
+        spawn_background(run)
+    return app
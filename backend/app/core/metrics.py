@@ -0,0 +1,250 @@
+import glob
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from flask import Flask, Response, g, has_request_context, request
+from pymongo import monitoring
+
+from app.core.cache import shared_versions
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+METRICS_FLUSH_INTERVAL = 5.0
+
+
+def record(resource, seconds):
+    """Charge one ``resource`` call of ``seconds`` to the current request"""
+    if not has_request_context():
+        return
+    stats = g.setdefault("request_stats", {})
+    calls, total = stats.get(resource, (0, 0.0))
+    stats[resource] = (calls + 1, total + seconds)
+
+
+@contextmanager
+def timed(resource):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(resource, time.perf_counter() - started)
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        record("mongo", event.duration_micros / 1000000)
+
+    def failed(self, event):
+        record("mongo", event.duration_micros / 1000000)
+
+
+class PoolListener(monitoring.ConnectionPoolListener):
+    """Tracks open and checked-out Mongo connections across all pools of this worker"""
+
+    def __init__(self) -> None:
+        self.open = 0
+        self.checked_out = 0
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self.open += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self.open -= 1
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        pass
+
+    def connection_checked_out(self, event):
+        self.checked_out += 1
+
+    def connection_checked_in(self, event):
+        self.checked_out -= 1
+
+
+pool_listener = PoolListener()
+
+
+class Metrics:
+    """In-process latency histograms and resource counters.
+
+    Each worker periodically writes a snapshot to ``<path>/metrics-<pid>.json``;
+    ``collect`` merges the snapshots of every live worker on the host.
+    """
+
+    def __init__(self, path=None, flush_interval=METRICS_FLUSH_INTERVAL) -> None:
+        self.path = path
+        self.flush_interval = flush_interval
+        self.flushed_at = 0.0
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = defaultdict(float)
+
+    def observe(self, route, method, status, seconds, resources):
+        key = f"{route}|{method}|{status}"
+        with self._lock:
+            histogram = self._histograms.setdefault(
+                key, {"buckets": [0] * len(LATENCY_BUCKETS), "count": 0, "sum": 0.0}
+            )
+            for index, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    histogram["buckets"][index] += 1
+            histogram["count"] += 1
+            histogram["sum"] += seconds
+            for resource, (calls, total) in resources.items():
+                self._counters[f"{resource}_calls_total|{route}"] += calls
+                self._counters[f"{resource}_seconds_total|{route}"] += total
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "histograms": json.loads(json.dumps(self._histograms)),
+                "counters": dict(self._counters),
+            }
+
+    def _snapshot_file(self, pid):
+        return os.path.join(self.path, f"metrics-{pid}.json")
+
+    def flush(self, force=False):
+        now = time.monotonic()
+        if not self.path or (not force and now - self.flushed_at < self.flush_interval):
+            return
+        self.flushed_at = now
+        os.makedirs(self.path, exist_ok=True)
+        target = self._snapshot_file(os.getpid())
+        with open(f"{target}.tmp", "w") as f:
+            json.dump(self.snapshot(), f)
+        os.replace(f"{target}.tmp", target)
+
+    def collect(self):
+        self.flush(force=True)
+        merged = {"histograms": {}, "counters": defaultdict(float)}
+        for snapshot_file in glob.glob(os.path.join(self.path, "metrics-*.json")):
+            pid = int(os.path.basename(snapshot_file)[len("metrics-"):-len(".json")])
+            if not _process_alive(pid):
+                os.remove(snapshot_file)
+                continue
+            try:
+                with open(snapshot_file) as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError):
+                continue
+            for key, histogram in snapshot["histograms"].items():
+                target = merged["histograms"].setdefault(
+                    key, {"buckets": [0] * len(LATENCY_BUCKETS), "count": 0, "sum": 0.0}
+                )
+                target["buckets"] = [a + b for a, b in zip(target["buckets"], histogram["buckets"])]
+                target["count"] += histogram["count"]
+                target["sum"] += histogram["sum"]
+            for key, value in snapshot["counters"].items():
+                merged["counters"][key] += value
+        return merged
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def render_prometheus(collected, gauges=None):
+    lines = [
+        "# HELP http_request_duration_seconds Request latency by route, method and status",
+        "# TYPE http_request_duration_seconds histogram",
+    ]
+    for key, histogram in sorted(collected["histograms"].items()):
+        route, method, status = key.split("|")
+        labels = f'route="{_escape(route)}",method="{method}",status="{status}"'
+        for bound, count in zip(LATENCY_BUCKETS, histogram["buckets"]):
+            lines.append(f'http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {count}')
+        lines.append(f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} {histogram["count"]}')
+        lines.append(f"http_request_duration_seconds_sum{{{labels}}} {histogram['sum']}")
+        lines.append(f"http_request_duration_seconds_count{{{labels}}} {histogram['count']}")
+
+    by_name = defaultdict(list)
+    for key, value in collected["counters"].items():
+        name, route = key.split("|", 1)
+        by_name[name].append((route, value))
+    for name in sorted(by_name):
+        lines.append(f"# TYPE app_{name} counter")
+        for route, value in sorted(by_name[name]):
+            lines.append(f'app_{name}{{route="{_escape(route)}"}} {value}')
+
+    for name, value in sorted((gauges or {}).items()):
+        lines.append(f"# TYPE app_{name} gauge")
+        lines.append(f"app_{name}{{pid=\"{os.getpid()}\"}} {value}")
+    return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+_mongo_listener = None
+
+
+def config_metrics(app: Flask):
+    """Register request timing hooks; must run before MongoEngine creates its client"""
+    global _mongo_listener
+    if _mongo_listener is None:
+        _mongo_listener = MongoCommandListener()
+        monitoring.register(_mongo_listener)
+        monitoring.register(pool_listener)
+
+    metrics.path = os.path.join(shared_versions.path, "metrics")
+    metrics.flush_interval = float(
+        app.config.get("METRICS_FLUSH_INTERVAL", METRICS_FLUSH_INTERVAL)
+    )
+
+    @app.after_request
+    def observe_request(response):
+        correlation = getattr(request, "correlation", None)
+        if correlation is None:
+            return response
+        route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        metrics.observe(
+            route,
+            request.method,
+            response.status_code,
+            time.perf_counter() - correlation.started,
+            g.get("request_stats", {}),
+        )
+        metrics.flush()
+        return response
+
+    return app
+
+
+def metrics_response(gauges=None):
+    return Response(
+        render_prometheus(metrics.collect(), gauges),
+        mimetype="text/plain; version=0.0.4",
+    )
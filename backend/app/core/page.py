@@ -1,7 +1,19 @@
-from werkzeug.exceptions import NotFound
+import base64
+import binascii
+import datetime
+import math
 
+from bson import ObjectId, json_util
+from bson.errors import BSONError
+from mongoengine.fields import DateTimeField, StringField
+from werkzeug.exceptions import BadRequest, NotFound
 
-def paginate(query_set, page_num, per_page_limit=10):
+from app.core.type import project, resolve_references
+
+
+def paginate(query_set, page_num, per_page_limit=10, schema=None):
+    if schema is not None:
+        return _paginate_resolved(query_set, page_num, per_page_limit, schema)
     try:
         paginated_objects = query_set.paginate(page=page_num, per_page=per_page_limit)
         return {
@@ -13,3 +25,139 @@ def paginate(query_set, page_num, per_page_limit=10):
         }
     except NotFound:
         raise NotFound("Page not found")
+
+
+def _paginate_resolved(query_set, page_num, per_page_limit, schema):
+    """Same page shape as ``paginate``, with references resolved in batch for ``schema``."""
+    if page_num < 1:
+        raise NotFound("Page not found")
+    total = query_set.count()
+    start_index = (page_num - 1) * per_page_limit
+    items = resolve_references(
+        project(query_set, schema).skip(start_index).limit(per_page_limit), schema
+    )
+    if not items and page_num != 1:
+        raise NotFound("Page not found")
+    return {
+        "total": total,
+        "page": page_num,
+        "pages": int(math.ceil(total / float(per_page_limit))),
+        "limit": per_page_limit,
+        "items": items,
+    }
+
+
+def encode_cursor(sort_key, value, object_id):
+    payload = json_util.dumps([sort_key, value, object_id])
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+
+# the value a cursor may carry for each type of sort field
+CURSOR_VALUE_TYPES = ((DateTimeField, datetime.datetime), (StringField, str))
+
+
+def cursor_value_type(field):
+    for field_type, value_type in CURSOR_VALUE_TYPES:
+        if isinstance(field, field_type):
+            return value_type
+    raise TypeError(f"Cannot paginate by cursor over a {type(field).__name__}")
+
+
+def decode_cursor(cursor, sort_key, value_type):
+    """The sort value and _id a cursor resumes after.
+
+    Both go into a raw query, so anything but a ``value_type`` and an
+    ObjectId (e.g. an operator document) is rejected.
+    """
+    try:
+        key, value, object_id = json_util.loads(base64.urlsafe_b64decode(cursor))
+    except (binascii.Error, BSONError, ValueError, TypeError):
+        raise BadRequest("Invalid cursor")
+    if key != sort_key:
+        raise BadRequest("Cursor does not match the requested sort order")
+    if not isinstance(value, value_type) or not isinstance(object_id, ObjectId):
+        raise BadRequest("Invalid cursor")
+    return value, object_id
+
+
+MAX_CURSOR_LIMIT = 100
+
+
+def get_cursor_args(args, sort_keys, default_sort):
+    """Cursor pagination options from a request's query string.
+
+    Returns None unless ``cursor`` is present; an empty ``cursor`` asks for
+    the first page.
+    """
+    if "cursor" not in args:
+        return None
+    sort = args.get("sort", default_sort)
+    if sort.lstrip("-") not in sort_keys:
+        raise BadRequest(f"Unsupported sort key '{sort}'")
+    total = args.get("total", None)
+    if total not in (None, "exact", "estimate"):
+        raise BadRequest("total must be 'exact' or 'estimate'")
+    try:
+        limit = int(args.get("limit", 10))
+    except ValueError:
+        raise BadRequest("limit must be an integer")
+    return {
+        "cursor": args.get("cursor") or None,
+        "limit": max(1, min(limit, MAX_CURSOR_LIMIT)),
+        "sort": sort,
+        "total": total,
+    }
+
+
+def paginate_by_cursor(
+    query_set, cursor=None, limit=10, sort_key="created_time", schema=None, total=None
+):
+    """Keyset pagination over ``(sort_key, _id)``.
+
+    Each page is a range scan that starts right after the last item of the
+    previous page, so deep pages cost the same as the first one. Prefix
+    ``sort_key`` with ``-`` for descending order. ``cursor`` is the opaque
+    ``next_cursor`` of the previous page, or None for the first page.
+
+    ``total`` is off by default. ``"exact"`` runs a ``count()`` of the
+    filtered query. ``"estimate"`` reads the collection's metadata count,
+    which ignores any filter.
+    """
+    descending = sort_key.startswith("-")
+    field_name = sort_key.lstrip("-")
+    db_field = query_set._document._translate_field_name(field_name)
+    direction = "-" if descending else "+"
+
+    page_query = query_set
+    if cursor:
+        value_type = cursor_value_type(query_set._document._fields[field_name])
+        value, object_id = decode_cursor(cursor, sort_key, value_type)
+        operator = "$lt" if descending else "$gt"
+        page_query = page_query.filter(
+            __raw__={
+                "$or": [
+                    {db_field: {operator: value}},
+                    {db_field: value, "_id": {operator: object_id}},
+                ]
+            }
+        )
+    page_query = page_query.order_by(f"{direction}{field_name}", f"{direction}id").limit(
+        limit + 1
+    )
+
+    if schema is not None:
+        items = resolve_references(project(page_query, schema, field_name), schema)
+    else:
+        items = list(page_query)
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        last = items[-1]
+        next_cursor = encode_cursor(sort_key, getattr(last, field_name), last.id)
+
+    page = {"limit": limit, "next_cursor": next_cursor, "items": items}
+    if total == "exact":
+        page["total"] = query_set.count()
+    elif total == "estimate":
+        page["total"] = query_set._collection.estimated_document_count()
+    return page
@@ -0,0 +1,89 @@
+import threading
+import time
+
+from werkzeug.exceptions import ServiceUnavailable
+
+
+def gevent_patched() -> bool:
+    try:
+        from gevent import monkey
+    except ImportError:
+        return False
+    return monkey.is_module_patched("threading")
+
+
+def start_native_thread(target, *args):
+    """Start ``target`` on a real OS thread, even inside a monkey-patched gevent worker"""
+    if gevent_patched():
+        from gevent import monkey
+
+        monkey.get_original("_thread", "start_new_thread")(target, args)
+    else:
+        threading.Thread(target=target, args=args, daemon=True).start()
+
+
+def spawn_background(target, *args):
+    """Run an I/O-bound loop in the background: a greenlet under gevent, a daemon thread otherwise"""
+    if gevent_patched():
+        import gevent
+
+        gevent.spawn(target, *args)
+    else:
+        threading.Thread(target=target, args=args, daemon=True).start()
+
+
+def native_sleep(seconds):
+    if gevent_patched():
+        from gevent import monkey
+
+        return monkey.get_original("time", "sleep")(seconds)
+    return time.sleep(seconds)
+
+
+class BlockingPool:
+    """Runs CPU-bound calls such as bcrypt outside the gevent event loop.
+
+    Under a monkey-patched gevent worker the call is handed to the hub's
+    native threadpool, so other greenlets keep running while it executes.
+    At most ``max_concurrency`` calls run at once; a caller that waits longer
+    than ``queue_timeout`` seconds for a slot gets a 503 instead of piling up.
+    """
+
+    def __init__(self, max_concurrency=2, queue_timeout=5.0) -> None:
+        self.configure(max_concurrency, queue_timeout)
+
+    def configure(self, max_concurrency=None, queue_timeout=None):
+        if max_concurrency is not None:
+            self.max_concurrency = max_concurrency
+            self._slots = threading.BoundedSemaphore(max_concurrency)
+        if queue_timeout is not None:
+            self.queue_timeout = queue_timeout
+
+    def run(self, func, *args):
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            raise ServiceUnavailable("Server is busy, please try again later")
+        try:
+            if gevent_patched():
+                from gevent import get_hub
+
+                threadpool = get_hub().threadpool
+                if threadpool.maxsize < self.max_concurrency:
+                    threadpool.maxsize = self.max_concurrency
+                return threadpool.apply(func, args)
+            return func(*args)
+        finally:
+            self._slots.release()
+
+
+BCRYPT_MAX_CONCURRENCY = 2
+BCRYPT_QUEUE_TIMEOUT = 5.0
+
+bcrypt_pool = BlockingPool(BCRYPT_MAX_CONCURRENCY, BCRYPT_QUEUE_TIMEOUT)
+
+
+def config_pool(app):
+    bcrypt_pool.configure(
+        max_concurrency=int(app.config.get("BCRYPT_MAX_CONCURRENCY", BCRYPT_MAX_CONCURRENCY)),
+        queue_timeout=float(app.config.get("BCRYPT_QUEUE_TIMEOUT", BCRYPT_QUEUE_TIMEOUT)),
+    )
+    return app
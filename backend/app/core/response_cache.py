@@ -0,0 +1,86 @@
+import json
+import os
+
+from flask import Response
+
+from app.core.cache import FileCache, SingleFlight, TTLCache, shared_versions
+from app.core.convertor import CustomEncoder
+from app.core.etag import conditional_response, make_etag
+
+RESPONSE_CACHE_BACKEND = "memory"
+RESPONSE_CACHE_SIZE = 1024
+# seconds an encoded response is reused, per namespace
+RESPONSE_CACHE_TTLS = {"campus": 3600, "courses": 300}
+RESPONSE_CACHE_DEFAULT_TTL = 60
+
+
+class ResponseCache:
+    """Encoded JSON responses shared between the restx resources and the services.
+
+    Keys are prefixed with their namespace's generation, a ``shared_versions``
+    stamp, so ``invalidate(namespace)`` drops the namespace in every worker on
+    the host whichever backend holds the entries: a per-worker ``TTLCache``
+    ("memory") or a ``FileCache`` all workers read ("file").
+    """
+
+    def __init__(self, backend=None, ttls=None) -> None:
+        self.backend = backend or TTLCache(RESPONSE_CACHE_SIZE, RESPONSE_CACHE_DEFAULT_TTL)
+        self.ttls = dict(RESPONSE_CACHE_TTLS if ttls is None else ttls)
+        self.flights = SingleFlight()
+
+    def _generation(self, namespace):
+        return shared_versions.version(f"responses:{namespace}")
+
+    def get_or_build(self, namespace, key, build):
+        # the generation is read before building, so a build racing an
+        # invalidation is stored under the old, already unreachable key
+        cache_key = f"{namespace}:{self._generation(namespace)}:{key!r}"
+        value = self.backend.get(cache_key)
+        if value is None:
+            # concurrent misses for one key share a single build
+            value = self.flights.do(cache_key, lambda: self._build(namespace, cache_key, build))
+        return value
+
+    def _build(self, namespace, cache_key, build):
+        value = build()
+        self.backend.set(cache_key, value, self.ttls.get(namespace, RESPONSE_CACHE_DEFAULT_TTL))
+        return value
+
+    def invalidate(self, *namespaces):
+        for namespace in namespaces:
+            shared_versions.bump(f"responses:{namespace}")
+
+
+response_cache = ResponseCache()
+
+
+def json_response(body: str) -> Response:
+    return Response(body + "\n", mimetype="application/json")
+
+
+def cached_response(namespace, key, render, etag=None):
+    """Serve the JSON encoding of ``render()`` from ``response_cache``.
+
+    ``etag`` (a tag or a callable producing one) is stored with the body and
+    defaults to a hash of it, so hits answer conditional GETs without a query.
+    """
+
+    def build():
+        body = json.dumps(render(), cls=CustomEncoder)
+        tag = etag() if callable(etag) else etag
+        return [tag or make_etag(body), body]
+
+    tag, body = response_cache.get_or_build(namespace, key, build)
+    return conditional_response(tag, lambda: json_response(body))
+
+
+def config_response_cache(app):
+    size = int(app.config.get("RESPONSE_CACHE_SIZE", RESPONSE_CACHE_SIZE))
+    ttls = {**RESPONSE_CACHE_TTLS, **app.config.get("RESPONSE_CACHE_TTLS", {})}
+    if app.config.get("RESPONSE_CACHE_BACKEND", RESPONSE_CACHE_BACKEND) == "file":
+        backend = FileCache(os.path.join(shared_versions.path, "responses"))
+    else:
+        backend = TTLCache(size, RESPONSE_CACHE_DEFAULT_TTL)
+    response_cache.backend = backend
+    response_cache.ttls = ttls
+    return app
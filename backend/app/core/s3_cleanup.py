@@ -0,0 +1,142 @@
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from botocore.exceptions import BotoCoreError, ClientError
+from flask import current_app
+from mongoengine import DateTimeField, Document, IntField, Q, StringField
+
+from app.core.pool import spawn_background
+from app.core.storage import s3
+
+S3_DELETE_BATCH_SIZE = 1000
+S3_CLEANUP_INTERVAL = 30.0
+S3_CLEANUP_LEASE_SECONDS = 300
+S3_CLEANUP_BACKOFF = 30
+S3_CLEANUP_MAX_BACKOFF = 3600
+
+
+class PendingS3Deletion(Document):
+    bucket = StringField(required=True)
+    key = StringField(required=True)
+    created_time = DateTimeField(default=datetime.utcnow)
+    next_attempt_at = DateTimeField(default=datetime.utcnow)
+    attempts = IntField(default=0)
+    lease_owner = StringField()
+    lease_until = DateTimeField()
+    last_error = StringField()
+
+    meta = {
+        "collection": "pending_s3_deletion",
+        "index_background": True,
+        "indexes": ["next_attempt_at", "lease_owner"],
+    }
+
+
+class S3CleanupWorker:
+    """Deletes S3 objects recorded in ``PendingS3Deletion`` off the request path.
+
+    Every worker process runs one loop; a batch is claimed with a lease so
+    processes do not delete the same keys twice, and keys that fail are
+    retried with exponential backoff until they succeed.
+    """
+
+    def __init__(self, batch_size=S3_DELETE_BATCH_SIZE, interval=S3_CLEANUP_INTERVAL) -> None:
+        self.batch_size = batch_size
+        self.interval = interval
+        self.owner = uuid.uuid4().hex
+        self.logger = None
+        self._woken = False
+
+    def schedule(self, keys, bucket=None):
+        bucket = bucket or current_app.config["AWS_BUCKET_NAME"]
+        pending = [PendingS3Deletion(bucket=bucket, key=key) for key in keys if key]
+        if not pending:
+            return 0
+        PendingS3Deletion.objects.insert(pending, load_bulk=False)
+        self._woken = True
+        return len(pending)
+
+    def start(self, logger):
+        self.logger = logger
+        spawn_background(self._run)
+
+    def _run(self):
+        while True:
+            try:
+                while self.process_batch() == self.batch_size:
+                    pass
+            except Exception:
+                self.logger.exception("S3 cleanup failed")
+            self._wait()
+
+    def _wait(self):
+        waited = 0.0
+        while waited < self.interval and not self._woken:
+            time.sleep(1)
+            waited += 1
+        self._woken = False
+
+    def _claim(self):
+        now = datetime.utcnow()
+        claimable = Q(next_attempt_at__lte=now) & (Q(lease_until=None) | Q(lease_until__lt=now))
+        ids = list(PendingS3Deletion.objects(claimable).limit(self.batch_size).scalar("id"))
+        if not ids:
+            return []
+        token = f"{self.owner}:{uuid.uuid4().hex}"
+        PendingS3Deletion.objects(claimable, id__in=ids).update(
+            set__lease_owner=token,
+            set__lease_until=now + timedelta(seconds=S3_CLEANUP_LEASE_SECONDS),
+        )
+        return list(PendingS3Deletion.objects(lease_owner=token))
+
+    def process_batch(self) -> int:
+        claimed = self._claim()
+        by_bucket = {}
+        for pending in claimed:
+            by_bucket.setdefault(pending.bucket, []).append(pending)
+
+        for bucket, batch in by_bucket.items():
+            try:
+                response = s3.delete_objects(
+                    Bucket=bucket,
+                    Delete={"Objects": [{"Key": pending.key} for pending in batch], "Quiet": True},
+                )
+                errors = {error["Key"]: error.get("Message", "") for error in response.get("Errors", [])}
+            except (BotoCoreError, ClientError) as error:
+                errors = {pending.key: str(error) for pending in batch}
+
+            done = [pending.id for pending in batch if pending.key not in errors]
+            if done:
+                PendingS3Deletion.objects(id__in=done).delete()
+            for pending in batch:
+                if pending.key in errors:
+                    self._retry(pending, errors[pending.key])
+            if errors:
+                self.logger.warning(f"S3 cleanup will retry {len(errors)} of {len(batch)} keys in {bucket}")
+        return len(claimed)
+
+    def _retry(self, pending, error):
+        delay = min(S3_CLEANUP_BACKOFF * 2 ** pending.attempts, S3_CLEANUP_MAX_BACKOFF)
+        pending.update(
+            inc__attempts=1,
+            set__next_attempt_at=datetime.utcnow() + timedelta(seconds=delay),
+            set__last_error=error,
+            unset__lease_owner=True,
+            unset__lease_until=True,
+        )
+
+
+s3_cleanup = S3CleanupWorker()
+
+
+def config_s3_cleanup(app):
+    s3_cleanup.interval = float(app.config.get("S3_CLEANUP_INTERVAL", S3_CLEANUP_INTERVAL))
+    return app
+
+
+def start_s3_cleanup(app):
+    """Start the cleanup loop; only the server entry points call this, not ``create_app``"""
+    if app.config.get("S3_CLEANUP_ENABLED", True):
+        s3_cleanup.start(app.logger)
+    return app
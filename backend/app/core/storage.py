@@ -1,31 +1,83 @@
+import math
+import os
+import time
+
 import boto3
+from botocore.exceptions import ClientError
 from flask import current_app
+from werkzeug.exceptions import BadRequest, NotFound
 from werkzeug.utils import secure_filename
 import base64
 from io import BytesIO
 from werkzeug.datastructures import FileStorage
 
-s3 = boto3.client("s3")
+from app.core.cache import TTLCache
+from app.core.metrics import timed
+
+# FLASK_AWS_S3_ENDPOINT_URL points the client at a local S3 stand-in (e.g. minio)
+s3 = boto3.client("s3", endpoint_url=os.getenv("FLASK_AWS_S3_ENDPOINT_URL") or None)
+
+SIGNED_URL_EXPIRES_IN = 3600
+# A cached URL is served for at most this long, so every URL handed to a
+# client still has at least (expires - ttl) seconds of validity left.
+SIGNED_URL_CACHE_TTL = 3000
+SIGNED_URL_CACHE_SIZE = 4096
+
+S3_UPLOAD_EXPIRES_IN = 900
+S3_MULTIPART_THRESHOLD = 100 * 1024 * 1024
+S3_MULTIPART_PART_SIZE = 16 * 1024 * 1024
+S3_MAX_UPLOAD_SIZE = 5 * 1024 * 1024 * 1024
+S3_MAX_PARTS = 10000
+
+signed_url_cache = TTLCache(maxsize=SIGNED_URL_CACHE_SIZE, ttl=SIGNED_URL_CACHE_TTL)
+
+
+def config_storage(app):
+    expires_in = int(app.config.get("SIGNED_URL_EXPIRES_IN", SIGNED_URL_EXPIRES_IN))
+    ttl = int(app.config.get("SIGNED_URL_CACHE_TTL", SIGNED_URL_CACHE_TTL))
+    app.config["SIGNED_URL_EXPIRES_IN"] = expires_in
+    signed_url_cache.configure(
+        maxsize=int(app.config.get("SIGNED_URL_CACHE_SIZE", SIGNED_URL_CACHE_SIZE)),
+        ttl=max(0, min(ttl, expires_in - 60)),
+    )
+    return app
 
 
 def upload_file_to_s3(file, resource_path):
     filename = secure_filename(file.filename)
     object_name = f"{resource_path}/{filename}"
-    s3.upload_fileobj(
-        file,
-        current_app.config["AWS_BUCKET_NAME"],
-        object_name,
-        ExtraArgs={"ContentType": file.content_type},
-    )
+    with timed("s3"):
+        s3.upload_fileobj(
+            file,
+            current_app.config["AWS_BUCKET_NAME"],
+            object_name,
+            ExtraArgs={"ContentType": file.content_type},
+        )
     return object_name
 
 
+def signed_url_epoch() -> int:
+    """Counter that advances every (expires - ttl) seconds.
+
+    A response revalidated within one epoch still carries signed URLs that
+    have not expired, so conditional GETs fold it into their ETag.
+    """
+    window = current_app.config.get("SIGNED_URL_EXPIRES_IN", SIGNED_URL_EXPIRES_IN) - signed_url_cache.ttl
+    return int(time.time() // max(window, 60))
+
+
 def generate_s3_signed_url(object_name):
-    return s3.generate_presigned_url(
-        "get_object",
-        Params={"Bucket": current_app.config["AWS_BUCKET_NAME"], "Key": object_name},
-        ExpiresIn=3600,
-    )
+    bucket = current_app.config["AWS_BUCKET_NAME"]
+    signed_url = signed_url_cache.get((bucket, object_name))
+    if signed_url is None:
+        with timed("s3"):
+            signed_url = s3.generate_presigned_url(
+                "get_object",
+                Params={"Bucket": bucket, "Key": object_name},
+                ExpiresIn=current_app.config.get("SIGNED_URL_EXPIRES_IN", SIGNED_URL_EXPIRES_IN),
+            )
+        signed_url_cache.set((bucket, object_name), signed_url)
+    return signed_url
 
 
 def base64_to_filestorage(base64_string, filename):
@@ -36,4 +88,98 @@ def base64_to_filestorage(base64_string, filename):
 
 def base64_to_s3_storage(base64_string, resource_path):
     file = base64_to_filestorage(base64_string, "cover_image.png")
-    return upload_file_to_s3(file, resource_path)
\ No newline at end of file
+    return upload_file_to_s3(file, resource_path)
+
+
+def create_presigned_upload(resource_path, filename, content_type, size, max_size=None):
+    """Presigned URLs that let the client upload straight to ``resource_path`` in S3.
+
+    Files up to S3_MULTIPART_THRESHOLD get a single presigned POST limited
+    to ``size`` bytes. Larger files get a multipart upload with one
+    presigned PUT URL per part; the client sends the returned ETags to the
+    completion endpoint.
+    """
+    config = current_app.config
+    max_size = max_size or int(config.get("S3_MAX_UPLOAD_SIZE", S3_MAX_UPLOAD_SIZE))
+    if size <= 0 or size > max_size:
+        raise BadRequest(f"File size must be between 1 and {max_size} bytes")
+
+    bucket = config["AWS_BUCKET_NAME"]
+    object_name = f"{resource_path}/{secure_filename(filename)}"
+    expires_in = int(config.get("S3_UPLOAD_EXPIRES_IN", S3_UPLOAD_EXPIRES_IN))
+
+    if size <= int(config.get("S3_MULTIPART_THRESHOLD", S3_MULTIPART_THRESHOLD)):
+        with timed("s3"):
+            post = s3.generate_presigned_post(
+                bucket,
+                object_name,
+                Fields={"Content-Type": content_type},
+                Conditions=[
+                    {"Content-Type": content_type},
+                    ["content-length-range", 1, size],
+                ],
+                ExpiresIn=expires_in,
+            )
+        return {
+            "object_name": object_name,
+            "method": "POST",
+            "url": post["url"],
+            "fields": post["fields"],
+        }
+
+    part_size = int(config.get("S3_MULTIPART_PART_SIZE", S3_MULTIPART_PART_SIZE))
+    part_size = max(part_size, math.ceil(size / S3_MAX_PARTS))
+    with timed("s3"):
+        upload_id = s3.create_multipart_upload(
+            Bucket=bucket, Key=object_name, ContentType=content_type
+        )["UploadId"]
+    parts = []
+    for part_number in range(1, math.ceil(size / part_size) + 1):
+        with timed("s3"):
+            url = s3.generate_presigned_url(
+                "upload_part",
+                Params={
+                    "Bucket": bucket,
+                    "Key": object_name,
+                    "UploadId": upload_id,
+                    "PartNumber": part_number,
+                },
+                ExpiresIn=expires_in,
+            )
+        parts.append({"part_number": part_number, "url": url})
+    return {
+        "object_name": object_name,
+        "method": "PUT",
+        "upload_id": upload_id,
+        "part_size": part_size,
+        "parts": parts,
+    }
+
+
+def complete_presigned_upload(resource_path, filename, upload_id=None, parts=None):
+    """Finish a presigned upload and return the object name once S3 has it"""
+    bucket = current_app.config["AWS_BUCKET_NAME"]
+    object_name = f"{resource_path}/{secure_filename(filename)}"
+    try:
+        with timed("s3"):
+            if upload_id:
+                s3.complete_multipart_upload(
+                    Bucket=bucket,
+                    Key=object_name,
+                    UploadId=upload_id,
+                    MultipartUpload={
+                        "Parts": [
+                            {"ETag": part["etag"], "PartNumber": part["part_number"]}
+                            for part in sorted(parts or [], key=lambda p: p["part_number"])
+                        ]
+                    },
+                )
+            s3.head_object(Bucket=bucket, Key=object_name)
+    except ClientError as e:
+        code = e.response.get("Error", {}).get("Code")
+        if code in ("404", "NoSuchKey", "NoSuchUpload"):
+            raise NotFound("Uploaded file not found")
+        if code in ("InvalidPart", "InvalidPartOrder", "EntityTooSmall"):
+            raise BadRequest(e.response["Error"].get("Message", code))
+        raise
+    return object_name
@@ -0,0 +1,24 @@
+from flask import current_app
+from mongoengine import get_connection
+
+TRANSACTION_TOPOLOGIES = ("ReplicaSetWithPrimary", "Sharded")
+
+
+def supports_transactions(client) -> bool:
+    try:
+        return client.topology_description.topology_type_name in TRANSACTION_TOPOLOGIES
+    except AttributeError:
+        return False
+
+
+def run_in_transaction(callback):
+    """Run ``callback(session)`` inside a multi-document transaction.
+
+    Transactions are opt-in through ``MONGODB_TRANSACTIONS`` and need a replica
+    set or sharded cluster; otherwise ``callback(None)`` runs without a session.
+    """
+    client = get_connection()
+    if not current_app.config.get("MONGODB_TRANSACTIONS", False) or not supports_transactions(client):
+        return callback(None)
+    with client.start_session() as session:
+        return session.with_transaction(callback)
@@ -1,9 +1,12 @@
-from bson import ObjectId
-from pydantic import BaseModel
+from bson import DBRef, ObjectId
+from functools import lru_cache
+from pydantic import BaseModel, SecretStr, create_model
 from pydantic.main import ModelMetaclass
+from mongoengine import ListField, ReferenceField
+from mongoengine.base import get_document
 from mongoengine.base.datastructures import BaseList,LazyReference
 from flask_mongoengine import Document
-from typing import Any,Optional
+from typing import Any,Iterable,Iterator,List,Optional,Type
 
 #Override the Model from pydandic for list display
 class MongoModel(BaseModel):
@@ -46,6 +49,22 @@ class PaginatedModel(MongoModel):
     limit: int
 
 
+class CursorPaginatedModel(MongoModel):
+    limit: int
+    next_cursor: Optional[str] = None
+    total: Optional[int] = None
+
+
+@lru_cache(maxsize=None)
+def cursor_page_schema(item_schema: Type[BaseModel]) -> Type[CursorPaginatedModel]:
+    """A CursorPaginatedModel whose ``items`` are rendered with ``item_schema``"""
+    return create_model(
+        f"{item_schema.__name__}CursorPage",
+        __base__=CursorPaginatedModel,
+        items=(List[item_schema], ...),
+    )
+
+
 class AllOptional(ModelMetaclass):
     def __new__(self, name, bases, namespace, **kwargs):
         annotations = namespace.get("__annotations__", {})
@@ -56,3 +75,114 @@ class AllOptional(ModelMetaclass):
                 annotations[field] = Optional[annotations[field]]
         namespace["__annotations__"] = annotations
         return super().__new__(self, name, bases, namespace, **kwargs)
+
+
+def _document_fields(document):
+    fields = set(document._fields)
+    for subclass in getattr(document, "_subclasses", ()):
+        fields.update(get_document(subclass)._fields)
+    return fields
+
+
+def schema_fields(schema: Type[BaseModel], document) -> List[str]:
+    """Names of the ``document`` fields (subclasses included) that ``schema`` reads through ``from_orm``.
+
+    ``SecretStr`` fields are never rendered, so they are never fetched either.
+    """
+    fields = _document_fields(document)
+    return [
+        field.alias
+        for field in schema.__fields__.values()
+        if field.alias in fields and field.type_ is not SecretStr
+    ]
+
+
+def project(query_set, schema: Type[BaseModel], *extra_fields):
+    """Restrict ``query_set`` to the fields ``schema`` renders"""
+    return query_set.only(*schema_fields(schema, query_set._document), *extra_fields)
+
+
+def _reference_id(value):
+    if isinstance(value, (DBRef, LazyReference, Document)):
+        return value.id
+    return value
+
+
+def _reference_field(document, name):
+    field = document._fields.get(name)
+    if isinstance(field, ReferenceField):
+        return field, False
+    if isinstance(field, ListField) and isinstance(field.field, ReferenceField):
+        return field.field, True
+    return None, False
+
+
+def resolve_references(documents: Iterable[Document], schema: Type[BaseModel]) -> List[Document]:
+    """Dereference every ReferenceField ``schema`` renders with one ``$in`` query per field.
+
+    Fields typed as ``PydanticObjectId`` only need the id, so they are never
+    fetched. Fields rendered by a nested schema are loaded with a projection
+    of that schema's fields and resolved recursively. The resolved documents
+    are written back into each document so ``from_orm`` does not trigger a
+    lazy lookup per item.
+    """
+    documents = list(documents)
+    for field in schema.__fields__.values():
+        name = field.alias
+        targets = [doc for doc in documents if _reference_field(doc, name)[0] is not None]
+        if not targets:
+            continue
+        reference_field, many = _reference_field(targets[0], name)
+        id_only = isinstance(field.type_, type) and issubclass(field.type_, PydanticObjectId)
+
+        values = {}
+        for doc in targets:
+            value = doc._data.get(name)
+            if value:
+                values[id(doc)] = list(value) if many else value
+
+        resolved = {}
+        if not id_only:
+            ids = {
+                _reference_id(ref)
+                for refs in values.values()
+                for ref in (refs if many else [refs])
+            }
+            if ids:
+                document_type = reference_field.document_type
+                resolved = document_type.objects.only(
+                    *schema_fields(field.type_, document_type)
+                ).in_bulk(list(ids))
+                resolve_references(resolved.values(), field.type_)
+
+        def _resolve(ref):
+            if id_only:
+                return _reference_id(ref)
+            return resolved.get(_reference_id(ref), ref)
+
+        for doc in targets:
+            if id(doc) not in values:
+                continue
+            if many:
+                items = BaseList([_resolve(ref) for ref in values[id(doc)]], doc, name)
+                items._dereferenced = True
+                doc._data[name] = items
+            else:
+                doc._data[name] = _resolve(values[id(doc)])
+    return documents
+
+
+def iter_resolved(query_set, schema: Type[BaseModel], batch_size=100) -> Iterator[Document]:
+    """Stream ``query_set`` projected to ``schema``, resolving references one batch at a time.
+
+    Only ``batch_size`` documents are held in memory at once, instead of the
+    whole result set.
+    """
+    batch = []
+    for document in project(query_set, schema).batch_size(batch_size):
+        batch.append(document)
+        if len(batch) >= batch_size:
+            yield from resolve_references(batch, schema)
+            batch = []
+    if batch:
+        yield from resolve_references(batch, schema)
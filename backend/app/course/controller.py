@@ -4,15 +4,22 @@ from flask_pydantic import validate
 from flask_restx import Namespace, Resource
 
 from app.course.schema import (
+    AttachmentUploadCompleteSchema,
+    CourseBasicInfoSchema,
     CourseCreateSchema,
     CourseDetailSchema,
-    CourseListSchema,
     CoursePutSchema,
+    CourseStudentListSchema,
     LectureCreateSchema,
     LectureListSchema,
     LecturePutSchema,
     LectureSchema,
+    UploadCompleteSchema,
+    UploadRequestSchema,
 )
+from app.core.convertor import serialize, serialize_many
+from app.core.response_cache import cached_response
+from app.core.storage import signed_url_epoch
 from app.course.service import course_service
 from app.user import permission_required
 
@@ -25,8 +32,15 @@ class CoursesApi(Resource):
     def get(self):
         campus = request.args.get("campus", None)
         teacher = request.args.get("teacher", None)
-        course_list = course_service().list_courses(campus=campus, teacher=teacher)
-        return CourseListSchema.from_orm(course_list), 200
+        service = course_service()
+        # the catalog is the same for every signed-in user; cover URLs roll over with the epoch
+        return cached_response(
+            "courses",
+            ("list", campus, teacher, signed_url_epoch()),
+            lambda: serialize_many(
+                CourseBasicInfoSchema, service.list_courses(campus=campus, teacher=teacher)
+            ),
+        )
 
     @permission_required("course_admin")
     @validate()
@@ -39,7 +53,16 @@ class CoursesApi(Resource):
 class CourseApi(Resource):
     @jwt_required()
     def get(self, course_id):
-        return CourseDetailSchema.from_orm(course_service().get_course(course_id))
+        service = course_service()
+        # the tag comes from the caller's get_course_query, so only callers
+        # allowed to see the course reach the shared cache entry or the load
+        etag = service.course_etag(course_id)
+        return cached_response(
+            "courses",
+            ("detail", course_id, etag),
+            lambda: serialize(CourseDetailSchema, service.get_course(course_id, authorized=True)),
+            etag=etag,
+        )
 
     @permission_required("course_admin")
     def delete(self, course_id):
@@ -52,6 +75,14 @@ class CourseApi(Resource):
         return
 
 
+@api.route("/<string:course_id>/students")
+class CourseStudentsApi(Resource):
+    @jwt_required()
+    def get(self, course_id):
+        page = int(request.args.get("page", 1))
+        return CourseStudentListSchema(**course_service().list_course_students(course_id, page))
+
+
 @api.route("/<string:course_id>/lectures")
 class CourseLecturesApi(Resource):
     @permission_required("course_admin")
@@ -105,6 +136,45 @@ class LectureAttachmentListApi(Resource):
         )
 
 
+@api.route("/<string:course_id>/lectures/<string:lecture_id>/attachments/uploads")
+class LectureAttachmentUploadApi(Resource):
+    @permission_required("course_admin")
+    @validate()
+    def post(self, course_id, lecture_id, body: UploadRequestSchema):
+        return (
+            course_service().create_attachment_upload(course_id, lecture_id, body),
+            201,
+        )
+
+
+@api.route(
+    "/<string:course_id>/lectures/<string:lecture_id>/attachments/uploads/complete"
+)
+class LectureAttachmentUploadCompleteApi(Resource):
+    @permission_required("course_admin")
+    @validate()
+    def post(self, course_id, lecture_id, body: AttachmentUploadCompleteSchema):
+        course_service().complete_attachment_upload(course_id, lecture_id, body)
+        return None, 201
+
+
+@api.route("/<string:course_id>/cover/uploads")
+class CourseCoverUploadApi(Resource):
+    @permission_required("course_admin")
+    @validate()
+    def post(self, course_id, body: UploadRequestSchema):
+        return course_service().create_cover_upload(course_id, body), 201
+
+
+@api.route("/<string:course_id>/cover/uploads/complete")
+class CourseCoverUploadCompleteApi(Resource):
+    @permission_required("course_admin")
+    @validate()
+    def post(self, course_id, body: UploadCompleteSchema):
+        course_service().complete_cover_upload(course_id, body)
+        return None, 201
+
+
 @api.route(
     "/<string:course_id>/lectures/<string:lecture_id>/attachments/<string:filename>"
 )
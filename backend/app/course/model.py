@@ -8,6 +8,7 @@ from mongoengine import (
     EmbeddedDocument,
     EmbeddedDocumentListField,
     FloatField,
+    IntField,
     ListField,
     ReferenceField,
     StringField,
@@ -45,11 +46,21 @@ class Course(Document):
     original_price = FloatField(default=0.0)
     cover_image = StringField(default="")
     lectures = EmbeddedDocumentListField(Lecture, default=[])
-    enrolled_students = ListField(
-        ReferenceField(Student, reverse_delete_rule=CASCADE, default=[])
+    # Bumped by every write that changes the course detail, see app.core.etag
+    version = IntField(default=0)
+    # Superseded by the Enrollment collection; kept so existing documents
+    # still load until `manage.py migrate-enrollments --unset` has run.
+    legacy_enrolled_students = ListField(
+        ReferenceField(Student), db_field="enrolled_students", default=[]
     )
 
-    meta = {"indexes": ["uni_course_code", "teacher", "campus"]}
+    meta = {
+        "index_background": True,
+        "indexes": ["uni_course_code", "teacher", "campus", "lectures.id"],
+    }
 
+    @property
+    def enrolled_count(self) -> int:
+        from app.enrollment.service import count_enrolled
 
-Student.register_delete_rule(Course, "enrolled_courses", CASCADE)
\ No newline at end of file
+        return count_enrolled(self.id)
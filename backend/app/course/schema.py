@@ -6,7 +6,13 @@ from uuid import UUID
 from pydantic import validator
 
 from app.core.storage import generate_s3_signed_url
-from app.core.type import AllOptional, MongoListModel, MongoModel, PydanticObjectId
+from app.core.type import (
+    AllOptional,
+    MongoListModel,
+    MongoModel,
+    PaginatedModel,
+    PydanticObjectId,
+)
 
 
 class LectureAttachmentSchema(MongoModel):
@@ -61,6 +67,15 @@ class CourseEnrolledStudentsSchema(MongoModel):
     display_name: str
 
 
+class CourseStudentSchema(MongoModel):
+    student: CourseEnrolledStudentsSchema
+    created_time: datetime
+
+
+class CourseStudentListSchema(PaginatedModel):
+    items: List[CourseStudentSchema]
+
+
 class CourseDetailSchema(MongoModel):
     id: PydanticObjectId
     name: str
@@ -73,7 +88,7 @@ class CourseDetailSchema(MongoModel):
     original_price: float
     cover_image: str
     lectures: List[LectureSchema]
-    enrolled_students: List[CourseEnrolledStudentsSchema]
+    enrolled_count: int
 
     @validator("cover_image")
     def generate_signed_url(cls, v):
@@ -125,3 +140,27 @@ class CourseBasicInfoSchema(MongoModel):
 
 class CourseListSchema(MongoListModel):
     __root__: List[CourseBasicInfoSchema]
+
+
+class UploadRequestSchema(MongoModel):
+    filename: str
+    content_type: str = "application/octet-stream"
+    size: int
+
+
+class UploadPartSchema(MongoModel):
+    part_number: int
+    etag: str
+
+
+class UploadCompleteSchema(MongoModel):
+    filename: str
+    upload_id: str = None
+    parts: List[UploadPartSchema] = []
+
+
+class AttachmentUploadCompleteSchema(UploadCompleteSchema):
+    name: str = None
+    type: str = ""
+    # as returned when the upload was created
+    object_name: str = None
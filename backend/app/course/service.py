@@ -1,50 +1,86 @@
+import re
 import uuid
-from typing import List
+from typing import Iterator, List
 
 from flask_jwt_extended import get_current_user
+from pymongo import ReturnDocument
 from werkzeug.datastructures import FileStorage
-from werkzeug.exceptions import NotFound
+from werkzeug.exceptions import BadRequest, NotFound
+from werkzeug.utils import secure_filename
 
 from app.campus.model import Campus
+from app.core.cache import SingleFlight
+from app.core.s3_cleanup import s3_cleanup
 from app.core.service import BaseService
-from app.core.storage import upload_file_to_s3, base64_to_filestorage
+from app.core.storage import (
+    base64_to_filestorage,
+    complete_presigned_upload,
+    create_presigned_upload,
+    signed_url_epoch,
+    upload_file_to_s3,
+)
 from app.course.model import Course, Lecture, LectureAttachment
 from app.course.schema import (
+    AttachmentUploadCompleteSchema,
+    CourseBasicInfoSchema,
     CourseCreateSchema,
+    CourseStudentSchema,
     CoursePutSchema,
     LectureAttachmentSchema,
     LectureCreateSchema,
     LecturePutSchema,
+    UploadCompleteSchema,
+    UploadRequestSchema,
 )
+from app.user import has_permission, user_role
 from app.user.model import Teacher, User, Student
 from app.core.convertor import prepare_reference_fields
+from app.core.etag import make_etag
+from app.core.response_cache import response_cache
+from app.core.page import paginate
+from app.core.type import iter_resolved
+from app.enrollment.model import Enrollment
+from app.enrollment.service import enroll, enrolled_course_ids
+from app.report.service import delete_orders
 from app.core.storage import base64_to_s3_storage
 
+COVER_IMAGE_MAX_SIZE = 10 * 1024 * 1024
+
+course_loads = SingleFlight()
+
 class CourseService(BaseService):
     def __init__(self, user: User) -> None:
         super().__init__(CourseService.__name__, user)
 
+    def _catalog_changed(self):
+        # Cached course details are keyed by version; the catalog lists are not
+        response_cache.invalidate("courses")
+
     def get_course_query(self, **kwargs):
-        if self.user._cls == "User.Admin" and "course_admin" in self.user.permissions:
+        if has_permission(self.user, "course_admin"):
             return Course.objects(**kwargs)
-        if self.user._cls == "User.Teacher":
-            return Course.objects(teacher=self.user, **kwargs)
+        if user_role(self.user) == "teacher":
+            return Course.objects(teacher=self.user.id, **kwargs)
         else:
-            return Course.objects(enrolled_students=self.user, **kwargs)
+            return Course.objects(id__in=enrolled_course_ids(self.user.id), **kwargs)
 
     def create_course(self, course: CourseCreateSchema) -> Course:
         self.logger.info("Creating courses")
         print(course.teacher, type(course.teacher))
         Campus.objects(id=course.campus).first_or_404("Campus not exists")
         Teacher.objects(id=course.teacher).first_or_404("Teacher not exists")
+        student_ids = set(course.enrolled_students)
+        if Student.objects(id__in=list(student_ids)).count() != len(student_ids):
+            raise NotFound("Student not exists")
         print(course.teacher, type(course.teacher))
         # Store the cover image temporarily
         temp_cover_image = course.cover_image
         
         # Create course without cover image first
-        course_data = course.dict(exclude={"cover_image"})
+        course_data = course.dict(exclude={"cover_image", "enrolled_students"})
         new_course = Course(**course_data)
         new_course.save()
+        enroll([(student_id, new_course.id) for student_id in course.enrolled_students])
         
         # Now upload the cover image with course ID in the path
         if temp_cover_image:
@@ -54,44 +90,71 @@ class CourseService(BaseService):
             # Update the course with the cover image URL
             new_course.cover_image = base64_to_s3_storage(temp_cover_image, s3_path)
             new_course.save()
-        
+
+        self._catalog_changed()
         return new_course
 
-    def list_courses(self, campus: str = None, teacher: str = None) -> List[Course]:
+    def list_courses(self, campus: str = None, teacher: str = None) -> Iterator[Course]:
         self.logger.info("Fetching courses")
         querys = {}
         if campus is not None:
             querys["campus"] = campus
         if teacher is not None:
             querys["teacher"] = teacher
-        return list(Course.objects(**querys))
+        return iter_resolved(Course.objects(**querys), CourseBasicInfoSchema)
 
-    def get_course(self, course_id: str) -> Course:
-        return self.get_course_query(id=course_id).first_or_404("Course not exists")
+    def get_course(self, course_id: str, authorized: bool = False) -> Course:
+        # callers that already ran the permission filter, e.g. through
+        # course_etag, pass authorized=True to save the round trip
+        if not authorized:
+            self.get_course_query(id=course_id).only("id").first_or_404("Course not exists")
+        # concurrent callers share one load of the course, which they must not modify
+        return course_loads.do(
+            course_id, lambda: Course.objects(id=course_id).first_or_404("Course not exists")
+        )
+
+    def course_etag(self, course_id: str) -> str:
+        course = self.get_course_query(id=course_id).only("version").as_pymongo().first()
+        if course is None:
+            raise NotFound("Course not exists")
+        # Signed cover/attachment URLs expire, so the tag also rolls over with them
+        return make_etag("course", course_id, course.get("version", 0), signed_url_epoch())
+
+    def list_course_students(self, course_id: str, page: int = 1):
+        self.get_course_query(id=course_id).only("id").first_or_404("Course not exists")
+        return paginate(
+            Enrollment.objects(course=course_id).order_by("student"),
+            page,
+            schema=CourseStudentSchema,
+        )
 
     def delete_course(self, course_id: str) -> int:
-        course = self.get_course_query(id=course_id).first_or_404("Course not exists")
-        if course.enrolled_students:
-            self.logger.info(f"Removing course from {len(course.enrolled_students)} student enrollments")
-            for student in course.enrolled_students:
-                # Update student's enrolled_courses list
-                Student.objects(id=student.id).update_one(pull__enrolled_courses=course.id)
-    
-        # Clean up S3 resources if needed
-        if course.cover_image:
-            # Here you might want to add S3 deletion logic
-            # For example: s3.delete_object(Bucket=current_app.config["AWS_BUCKET_NAME"], Key=course.cover_image)
-            self.logger.info(f"Deleting course cover image: {course.cover_image}")
-        
-        # For each lecture, clean up attachments if needed
-        for lecture in course.lectures:
-            for attachment in lecture.attachments:
-                if attachment.bucket_url:
-                    # Here you might want to add S3 deletion logic for attachments
-                    self.logger.info(f"Deleting lecture attachment: {attachment.bucket_url}")
-        
-        # Perform the actual deletion
-        course.delete()
+        course = (
+            self.get_course_query(id=course_id)
+            .only("id", "cover_image", "lectures.attachments.bucket_url")
+            .as_pymongo()
+            .first()
+        )
+        if course is None:
+            raise NotFound("Course not exists")
+
+        unenrolled = Enrollment.objects(course=course["_id"]).delete()
+        if unenrolled:
+            self.logger.info(f"Removing course from {unenrolled} student enrollments")
+
+        # S3 objects are removed by the background cleanup worker
+        keys = [course.get("cover_image")] + [
+            attachment.get("bucket_url")
+            for lecture in course.get("lectures", [])
+            for attachment in lecture.get("attachments", [])
+        ]
+        scheduled = s3_cleanup.schedule(keys)
+        if scheduled:
+            self.logger.info(f"Scheduled {scheduled} S3 objects for deletion")
+
+        delete_orders(course=course["_id"])
+        Course.objects(id=course["_id"]).delete()
+        self._catalog_changed()
         return 1  # Indicating successful deletion
 
     def update_course(self, course_id: str, course: CoursePutSchema):
@@ -106,24 +169,28 @@ class CourseService(BaseService):
             return
         
         Course.objects(id=course_id).first_or_404("Course not exists").update(
-            **update_dict
+            inc__version=1, **update_dict
         )
+        self._catalog_changed()
 
     def add_lecture(self, course_id: str, lecture: LectureCreateSchema) -> int:
         lecture.id = uuid.uuid4()
-        course: Course = Course.objects(id=course_id).first_or_404("Course not exists")
-        course.update(push__lectures=lecture.dict(exclude_none=True))
+        if not Course.objects(id=course_id).update_one(
+            push__lectures=lecture.dict(exclude_none=True), inc__version=1
+        ):
+            raise NotFound("Course not exists")
         return str(lecture.id)
 
     def list_lectures(self, course_id: str) -> List[Lecture]:
         return Course.objects(id=course_id).first_or_404("Course not exists").lectures
 
     def delete_lecture(self, course_id: str, lecture_id: str) -> int:
-        return (
-            Course.objects(id=course_id)
-            .filter(lectures__id=lecture_id)
-            .update_one(pull__lectures__id=lecture_id)
+        deleted = Course.objects(id=course_id, lectures__id=lecture_id).update_one(
+            pull__lectures__id=lecture_id, inc__version=1
         )
+        if not deleted:
+            raise NotFound("Lecture not exists")
+        return deleted
 
     def update_lecture(
         self, course_id: str, lecture_id: str, lecture: LecturePutSchema
@@ -132,43 +199,131 @@ class CourseService(BaseService):
             f"set__lectures__S__{key}": value
             for key, value in lecture.dict(exclude_defaults=True).items()
         }
-        return (
-            Course.objects(id=course_id)
-            .filter(lectures__id=lecture_id)
-            .update_one(**update_action)
+        updated = Course.objects(id=course_id, lectures__id=lecture_id).update_one(
+            inc__version=1, **update_action
         )
+        if not updated:
+            raise NotFound("Lecture not exists")
+        return updated
 
     def upload_lecture_attachment(
         self, course_id: str, lecture_id: str, file: FileStorage, file_type: str, name
     ):
-        course: Course = Course.objects(id=course_id).first_or_404("Course not exists")
-        lecture: Lecture = course.lectures.filter(id=lecture_id).first()
-        if lecture is None:
+        if not Course.objects(id=course_id, lectures__id=lecture_id).only("id").first():
             raise NotFound("Lecture not exists")
 
-        url = upload_file_to_s3(
-            file, f"courses/{course_id}/lectures/{lecture_id}/attachments"
-        )
+        url = upload_file_to_s3(file, attachment_path(course_id, lecture_id))
         attachment = LectureAttachment(
             name=name is not None and name or file.filename,
             filename=file.filename,
             type=file_type,
             bucket_url=url,
         )
-        Course.objects(id=course_id).filter(lectures__id=lecture_id).update_one(
-            push__lectures__S__attachments=attachment
-        )
+        if not Course.objects(id=course_id, lectures__id=lecture_id).update_one(
+            push__lectures__S__attachments=attachment, inc__version=1
+        ):
+            # the lecture was removed while the file was uploading
+            s3_cleanup.schedule([url])
+            raise NotFound("Lecture not exists")
 
     def delete_attachment(self, course_id: str, lecture_id: str, filename: str):
-        course: Course = Course.objects(id=course_id).first_or_404("Course not exists")
-        lecture: Lecture = course.lectures.filter(id=lecture_id).first()
+        lecture_id = Lecture.id.to_mongo(lecture_id)
+        # the lecture as it was before the pull tells which objects to remove from S3
+        course = Course._get_collection().find_one_and_update(
+            {"_id": Course.id.to_mongo(course_id), "lectures.id": lecture_id},
+            {
+                "$pull": {"lectures.$.attachments": {"filename": filename}},
+                "$inc": {"version": 1},
+            },
+            projection={"lectures": {"$elemMatch": {"id": lecture_id}}},
+            return_document=ReturnDocument.BEFORE,
+        )
+        if course is None:
+            raise NotFound("Lecture not exists")
+
+        removed = [
+            attachment
+            for attachment in course["lectures"][0].get("attachments", [])
+            if attachment.get("filename") == filename
+        ]
+        s3_cleanup.schedule([attachment.get("bucket_url") for attachment in removed])
+        return len(removed), 200
+
+    def create_attachment_upload(
+        self, course_id: str, lecture_id: str, upload: UploadRequestSchema
+    ) -> dict:
+        if not Course.objects(id=course_id, lectures__id=lecture_id).only("id").first():
+            raise NotFound("Lecture not exists")
+        return create_presigned_upload(
+            attachment_path(course_id, lecture_id),
+            upload.filename,
+            upload.content_type,
+            upload.size,
+        )
 
-        if lecture is None:
+    def complete_attachment_upload(
+        self, course_id: str, lecture_id: str, upload: AttachmentUploadCompleteSchema
+    ):
+        url = complete_presigned_upload(
+            attachment_upload_path(course_id, lecture_id, upload),
+            upload.filename,
+            upload.upload_id,
+            [part.dict() for part in upload.parts],
+        )
+        attachment = LectureAttachment(
+            name=upload.name or upload.filename,
+            filename=upload.filename,
+            type=upload.type,
+            bucket_url=url,
+        )
+        updated = Course.objects(id=course_id, lectures__id=lecture_id).update_one(
+            push__lectures__S__attachments=attachment, inc__version=1
+        )
+        if not updated:
             raise NotFound("Lecture not exists")
 
-        del_num = lecture.attachments.filter(filename=filename).delete()
-        course.save()
-        return del_num, 200
+    def create_cover_upload(self, course_id: str, upload: UploadRequestSchema) -> dict:
+        if not upload.content_type.startswith("image/"):
+            raise BadRequest("Cover image must be an image")
+        Course.objects(id=course_id).only("id").first_or_404("Course not exists")
+        return create_presigned_upload(
+            f"courses/{course_id}",
+            upload.filename,
+            upload.content_type,
+            upload.size,
+            max_size=COVER_IMAGE_MAX_SIZE,
+        )
+
+    def complete_cover_upload(self, course_id: str, upload: UploadCompleteSchema):
+        url = complete_presigned_upload(
+            f"courses/{course_id}",
+            upload.filename,
+            upload.upload_id,
+            [part.dict() for part in upload.parts],
+        )
+        if not Course.objects(id=course_id).update_one(set__cover_image=url, inc__version=1):
+            raise NotFound("Course not exists")
+        self._catalog_changed()
+
+
+def attachment_path(course_id, lecture_id) -> str:
+    # every upload gets its own prefix, so a re-upload under the same filename
+    # never shares a key with an attachment already scheduled for deletion
+    return f"courses/{course_id}/lectures/{lecture_id}/attachments/{uuid.uuid4().hex}"
+
+
+def attachment_upload_path(course_id, lecture_id, upload: AttachmentUploadCompleteSchema) -> str:
+    """The prefix ``create_attachment_upload`` chose, from the object name the client echoes back"""
+    prefix = f"courses/{course_id}/lectures/{lecture_id}/attachments"
+    if upload.object_name is None:
+        # uploads started before attachment keys were unique
+        return prefix
+    path, _, filename = upload.object_name.rpartition("/")
+    if not re.fullmatch(re.escape(prefix) + "/[0-9a-f]{32}", path) or (
+        filename != secure_filename(upload.filename)
+    ):
+        raise BadRequest("object_name does not belong to this upload")
+    return path
 
 
 def course_service():
@@ -0,0 +1,21 @@
+from datetime import datetime
+
+from flask_mongoengine import Document
+from mongoengine import CASCADE, DateTimeField, ReferenceField
+
+from app.course.model import Course
+from app.user.model import Student
+
+
+class Enrollment(Document):
+    course = ReferenceField(Course, required=True, reverse_delete_rule=CASCADE)
+    student = ReferenceField(Student, required=True, reverse_delete_rule=CASCADE)
+    created_time = DateTimeField(default=datetime.utcnow)
+
+    meta = {
+        "index_background": True,
+        "indexes": [
+            {"fields": ["course", "student"], "unique": True},
+            {"fields": ["student", "course"]},
+        ]
+    }
@@ -0,0 +1,100 @@
+from datetime import datetime
+
+from pymongo import UpdateOne
+
+from app.core.type import project, resolve_references
+from app.course.model import Course
+from app.course.schema import CourseBasicInfoSchema
+from app.enrollment.model import Enrollment
+from app.user.model import Student
+
+
+def enroll(enrollments, session=None):
+    """Upsert (student_id, course_id) pairs into ``Enrollment`` with one ``bulk_write``
+
+    Courses that gained a student get their ``version`` bumped, since the
+    course detail shows the enrolled count.
+    """
+    # ids may arrive as strings from request schemas; store them as ObjectIds
+    # so lookups and the unique (course, student) index match every writer
+    enrollments = list(
+        {
+            (Enrollment.student.to_mongo(student_id), Enrollment.course.to_mongo(course_id))
+            for student_id, course_id in enrollments
+        }
+    )
+    if not enrollments:
+        return
+    now = datetime.utcnow()
+    result = Enrollment._get_collection().bulk_write(
+        [
+            UpdateOne(
+                {"course": course_id, "student": student_id},
+                {"$setOnInsert": {"created_time": now}},
+                upsert=True,
+            )
+            for student_id, course_id in enrollments
+        ],
+        ordered=False,
+        session=session,
+    )
+    course_ids = list({enrollments[index][1] for index in result.upserted_ids})
+    if course_ids:
+        Course._get_collection().update_many(
+            {"_id": {"$in": course_ids}}, {"$inc": {"version": 1}}, session=session
+        )
+
+
+def enrolled_course_ids(student_id):
+    return [
+        enrollment["course"]
+        for enrollment in Enrollment.objects(student=student_id).only("course").as_pymongo()
+    ]
+
+
+def enrolled_courses(student_ids):
+    """Map each student id to its enrolled courses, loaded in batch for ``CourseBasicInfoSchema``"""
+    enrollments = list(
+        Enrollment.objects(student__in=student_ids)
+        .only("student", "course", "created_time")
+        .order_by("created_time")
+        .as_pymongo()
+    )
+    course_ids = list({enrollment["course"] for enrollment in enrollments})
+    courses = {
+        course.id: course
+        for course in resolve_references(
+            project(Course.objects(id__in=course_ids), CourseBasicInfoSchema),
+            CourseBasicInfoSchema,
+        )
+    }
+    by_student = {student_id: [] for student_id in student_ids}
+    for enrollment in enrollments:
+        course = courses.get(enrollment["course"])
+        if course is not None:
+            by_student.setdefault(enrollment["student"], []).append(course)
+    return by_student
+
+
+def enrolled_course_ids_by_student(student_ids):
+    by_student = {student_id: [] for student_id in student_ids}
+    for enrollment in (
+        Enrollment.objects(student__in=student_ids).only("student", "course").as_pymongo()
+    ):
+        by_student.setdefault(enrollment["student"], []).append(enrollment["course"])
+    return by_student
+
+
+def prefetch_enrolled_courses(students, ids_only=False):
+    """Load the enrollments of many students at once; ``ids_only`` skips loading the courses"""
+    students = [student for student in students if isinstance(student, Student)]
+    if not students:
+        return
+    load = enrolled_course_ids_by_student if ids_only else enrolled_courses
+    by_student = load([student.id for student in students])
+    for student in students:
+        student._prefetched_enrolled_courses = by_student[student.id]
+
+
+def count_enrolled(course_id) -> int:
+    return Enrollment.objects(course=course_id).count()
@@ -1,5 +1,6 @@
 from flask import request
-from flask_jwt_extended.exceptions import NoAuthorizationError
+from flask_jwt_extended.exceptions import JWTExtendedException
+from jwt.exceptions import PyJWTError
 from mongoengine import ValidationError as MongoengineValidationError
 from pydantic import ValidationError as PydanticValidationError
 from werkzeug.exceptions import HTTPException
@@ -8,11 +9,17 @@ from .permission_exceptions import PermissionDenied
 
 
 def register_resources_exception_handler(api):
-    @api.errorhandler(NoAuthorizationError)
-    def handle_authorization_error(e: NoAuthorizationError):
+    # missing, expired and revoked tokens all answer 401 so the client refreshes
+    @api.errorhandler(JWTExtendedException)
+    def handle_authorization_error(e: JWTExtendedException):
         request.logger.error(getattr(e, "description", str(e)))
         return {"code": 401, "message": getattr(e, "description", str(e))}, 401
 
+    @api.errorhandler(PyJWTError)
+    def handle_token_error(e: PyJWTError):
+        request.logger.error(str(e))
+        return {"code": 401, "message": str(e)}, 401
+
     @api.errorhandler(PermissionDenied)
     def handle_permission_denied(e: PermissionDenied):
         request.logger.error(getattr(e, "description", str(e)))
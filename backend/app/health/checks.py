@@ -0,0 +1,81 @@
+import threading
+import time
+from datetime import datetime
+
+from flask import current_app
+from mongoengine.connection import get_connection
+
+from app.core.metrics import pool_listener
+from app.core.storage import s3
+
+DEEPCHECK_CACHE_SECONDS = 10.0
+
+_lock = threading.Lock()
+_last_result = None
+_last_checked = 0.0
+
+
+def _probe(check):
+    started = time.perf_counter()
+    try:
+        details = check() or {}
+        status = "up"
+    except Exception as e:
+        details = {"error": str(e)}
+        status = "down"
+    return {"status": status, "latency": round(time.perf_counter() - started, 4), **details}
+
+
+def check_mongo():
+    get_connection().admin.command("ping")
+
+
+def check_s3_signing():
+    s3.generate_presigned_url(
+        "get_object",
+        Params={"Bucket": current_app.config["AWS_BUCKET_NAME"], "Key": "healthcheck"},
+        ExpiresIn=60,
+    )
+
+
+def check_event_loop():
+    # sleep(0) yields to the gevent hub; how long it takes to get scheduled
+    # again is the time other greenlets currently hold the loop
+    started = time.perf_counter()
+    time.sleep(0)
+    return {"lag": round(time.perf_counter() - started, 4)}
+
+
+def check_connection_pool():
+    client = get_connection()
+    return {
+        "open": pool_listener.open,
+        "checkedOut": pool_listener.checked_out,
+        "maxPoolSize": int(client.options.pool_options.max_pool_size),
+    }
+
+
+def run_deep_check():
+    checks = {
+        "mongo": _probe(check_mongo),
+        "s3Signing": _probe(check_s3_signing),
+        "eventLoop": _probe(check_event_loop),
+        "connectionPool": _probe(check_connection_pool),
+    }
+    status = "up" if all(c["status"] == "up" for c in checks.values()) else "down"
+    return {"status": status, "checkedAt": datetime.utcnow().isoformat(), "checks": checks}
+
+
+def cached_deep_check():
+    """The latest deep check, recomputed at most once per DEEPCHECK_CACHE_SECONDS per worker.
+
+    Concurrent probes wait on the lock and reuse the result of the one that
+    ran the checks, so load-balancer traffic never multiplies backend load.
+    """
+    global _last_result, _last_checked
+    max_age = float(current_app.config.get("DEEPCHECK_CACHE_SECONDS", DEEPCHECK_CACHE_SECONDS))
+    with _lock:
+        if _last_result is None or time.monotonic() - _last_checked >= max_age:
+            _last_result = run_deep_check()
+            _last_checked = time.monotonic()
+        return _last_result
@@ -1,6 +1,11 @@
 from flask_restx import Namespace,Resource
 from datetime import datetime
 
+from app.core.metrics import metrics_response
+from app.health.checks import cached_deep_check
+from app.core.storage import signed_url_cache
+from app.log import dropped_log_records
+
 api = Namespace("health")
 
 @api.route("/")
@@ -11,5 +16,21 @@ class HealthApi(Resource):
 @api.route("/deepcheck")
 class HealthApi(Resource):
     def get(self):
-        return [{"status":"up"}]
+        result = cached_deep_check()
+        return [result], 200 if result["status"] == "up" else 503
+
+@api.route("/cache")
+class CacheStatsApi(Resource):
+    def get(self):
+        return {"signed_url": signed_url_cache.stats()}
+
+@api.route("/metrics")
+class MetricsApi(Resource):
+    def get(self):
+        cache_stats = signed_url_cache.stats()
+        return metrics_response({
+            "signed_url_cache_hits": cache_stats["hits"],
+            "signed_url_cache_misses": cache_stats["misses"],
+            "log_records_dropped": dropped_log_records(),
+        })
     
@@ -1,16 +1,26 @@
 import os
+import atexit
+import gzip
 import logging
+import logging.handlers
+import random
+import shutil
+import time
 import uuid
 import json
+from collections import deque
 from datetime import datetime
 
-from flask import Flask,request
+from flask import Flask,g,request
 from pythonjsonlogger import jsonlogger
 
+from app.core.pool import native_sleep, start_native_thread
+
 class Correlation:
     def __init__(self):
         self.id = uuid.uuid4()
         self.timestamp = datetime.utcnow()
+        self.started = time.perf_counter()
 
     def to_dict(self):
         return {
@@ -19,8 +29,7 @@ class Correlation:
         }
     
     def get_duration_in_seconds(self):
-        elpased = datetime.utcnow() - self.timestamp
-        return round(elpased.microseconds / 1000 / 1000, 3)
+        return round(time.perf_counter() - self.started, 3)
 
 
 class CorrelationLoggerDecorator:
@@ -47,26 +56,188 @@ class CorrelationLoggerDecorator:
     def getChild(self,name):
         return CorrelationLoggerDecorator(self.logger.getChild(name),self.base)
 
-    
+
+
+class CompressingRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """Rotates on size or age and gzips rotated files.
+
+    Records are written in batches by ``BackgroundLogWriter``, which is the
+    only caller, so no handler lock is taken on the write path. Rotation
+    renames and removes the file, so each process needs a file of its own.
+    """
+
+    def __init__(self, filename, max_bytes=0, backup_count=0, interval=0):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count)
+        self.interval = interval
+        self.opened_at = time.time()
+        self.namer = lambda name: name + ".gz"
+        self.rotator = self._compress
+
+    @staticmethod
+    def _compress(source, dest):
+        with open(source, "rb") as plain, gzip.open(dest, "wb") as compressed:
+            shutil.copyfileobj(plain, compressed)
+        os.remove(source)
+
+    def shouldRollover(self, record):
+        if self.interval and time.time() - self.opened_at >= self.interval:
+            return True
+        return super().shouldRollover(record)
+
+    def doRollover(self):
+        super().doRollover()
+        self.opened_at = time.time()
+
+    def emit_batch(self, records):
+        for record in records:
+            try:
+                if self.shouldRollover(record):
+                    self.doRollover()
+                if self.stream is None:
+                    self.stream = self._open()
+                self.stream.write(self.format(record) + self.terminator)
+            except Exception:
+                self.handleError(record)
+        if self.stream is not None:
+            self.stream.flush()
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Queues records for the background writer; drops and counts them when the queue is full."""
+
+    def __init__(self, maxsize):
+        super().__init__(deque())
+        self.maxsize = maxsize
+        self.dropped = 0
+
+    def enqueue(self, record):
+        if len(self.queue) >= self.maxsize:
+            self.dropped += 1
+            return
+        self.queue.append(record)
+
+
+class BackgroundLogWriter:
+    """Drains a DroppingQueueHandler on a native thread, writing up to ``batch_size`` records per flush"""
+
+    def __init__(self, queue_handler, handler, batch_size=256, flush_interval=0.5):
+        self.queue_handler = queue_handler
+        self.handler = handler
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.reported_drops = 0
+
+    def start(self):
+        start_native_thread(self._run)
+        atexit.register(self.drain)
+
+    def _run(self):
+        while True:
+            if not self.drain():
+                native_sleep(self.flush_interval)
+
+    def drain(self):
+        queue = self.queue_handler.queue
+        written = 0
+        while queue:
+            batch = []
+            while queue and len(batch) < self.batch_size:
+                batch.append(queue.popleft())
+            self.handler.emit_batch(batch)
+            written += len(batch)
+        dropped = self.queue_handler.dropped
+        if dropped != self.reported_drops:
+            self.handler.emit_batch([
+                logging.makeLogRecord({
+                    "name": __name__,
+                    "levelno": logging.WARNING,
+                    "levelname": "WARNING",
+                    "module": "log",
+                    "msg": "log records dropped",
+                    "dropped": dropped - self.reported_drops,
+                    "droppedTotal": dropped,
+                })
+            ])
+            self.reported_drops = dropped
+        return written
+
+
+def parse_sample_rates(value):
+    """Parse ``"GET /api/v1/courses=0.1,/api/v1/health=0.01"`` into ``{(method, path): rate}``"""
+    rates = {}
+    for item in (value or "").split(","):
+        if "=" not in item:
+            continue
+        target, rate = item.rsplit("=", 1)
+        method, _, path = target.strip().rpartition(" ")
+        rates[(method.upper() or None, path.rstrip("/") or "/")] = float(rate)
+    return rates
+
+
+def get_sample_rate(rates, method, path):
+    path = path.rstrip("/") or "/"
+    return rates.get((method, path), rates.get((None, path), 1.0))
+
+
+LOG_QUEUE_SIZE = 10000
+LOG_BATCH_SIZE = 256
+LOG_FLUSH_INTERVAL = 0.5
+LOG_MAX_BYTES = 50 * 1024 * 1024
+LOG_BACKUP_COUNT = 10
+LOG_ROTATE_INTERVAL = 24 * 60 * 60
+
+log_queue_handler = None
+
+
+def dropped_log_records():
+    return log_queue_handler.dropped if log_queue_handler is not None else 0
+
 
 def config_log(app:Flask):
+    global log_queue_handler
+
     log_path = os.path.join(app.root_path,"logs")
     if not os.path.exists(log_path):
         os.makedirs(log_path)
 
-    file_handler = logging.FileHandler(f"{log_path}/default.log")
-    json_formatter=jsonlogger.JsonFormatter('%(asctime)s %(levelname)s %(module)s %(message)s')
-    file_handler.setFormatter(json_formatter)
+    if log_queue_handler is None:
+        # one file per gunicorn worker: a shared file rotated by one of them
+        # would leave the others writing to the removed inode
+        file_handler = CompressingRotatingFileHandler(
+            f"{log_path}/default-{os.getpid()}.log",
+            max_bytes=int(app.config.get("LOG_MAX_BYTES", LOG_MAX_BYTES)),
+            backup_count=int(app.config.get("LOG_BACKUP_COUNT", LOG_BACKUP_COUNT)),
+            interval=int(app.config.get("LOG_ROTATE_INTERVAL", LOG_ROTATE_INTERVAL)),
+        )
+        json_formatter=jsonlogger.JsonFormatter('%(asctime)s %(levelname)s %(module)s %(message)s')
+        file_handler.setFormatter(json_formatter)
 
-    app.logger.addHandler(file_handler)
+        log_queue_handler = DroppingQueueHandler(
+            int(app.config.get("LOG_QUEUE_SIZE", LOG_QUEUE_SIZE))
+        )
+        BackgroundLogWriter(
+            log_queue_handler,
+            file_handler,
+            batch_size=int(app.config.get("LOG_BATCH_SIZE", LOG_BATCH_SIZE)),
+            flush_interval=float(app.config.get("LOG_FLUSH_INTERVAL", LOG_FLUSH_INTERVAL)),
+        ).start()
+
+    app.logger.addHandler(log_queue_handler)
     app.logger.setLevel(logging.DEBUG)
 
+    sample_rates = parse_sample_rates(app.config.get("LOG_SAMPLE_RATES"))
+
     @app.before_request
     def before_request():
         request.correlation = Correlation()
         request.logger = CorrelationLoggerDecorator(
             app.logger,request.correlation.to_dict()
         )
+        request.correlation.sampled = (
+            random.random() < get_sample_rate(sample_rates, request.method, request.path)
+        )
+        if not request.correlation.sampled:
+            return
 
         extra ={
             "x-request-id": request.headers.get("x-request-id"),
@@ -78,6 +249,8 @@ def config_log(app:Flask):
 
     @app.after_request
     def after_request(response):
+        if not request.correlation.sampled and response.status_code < 500:
+            return response
         extra = {
             "x-request-id": request.headers.get("x-request-id"),
             "method": request.method,
@@ -85,6 +258,9 @@ def config_log(app:Flask):
             "statusCode": response.status_code,
             "duration": request.correlation.get_duration_in_seconds(),
         }
+        for resource, (calls, seconds) in g.get("request_stats", {}).items():
+            extra[f"{resource}Calls"] = calls
+            extra[f"{resource}Seconds"] = round(seconds, 3)
         request.logger.info("response", extra)
         return response
 
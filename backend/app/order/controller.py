@@ -3,29 +3,42 @@ from flask_jwt_extended import jwt_required
 from flask_pydantic import validate
 from flask_restx import Namespace, Resource
 
+from app.core.convertor import serialize
+from app.core.export import stream_export
+from app.core.page import get_cursor_args
 from app.order.schema import (
+    OrderBatchCreateSchema,
+    OrderBatchPaymentSchema,
     OrderCreateSchema,
+    OrderCursorListSchema,
     OrderListSchema,
     OrderPaymentSchema,
     OrderSchema,
 )
-from app.order.service import order_service
+from app.order.service import ORDER_EXPORT_COLUMNS, order_service
 from app.user import permission_required
 
 api = Namespace("orders")
 
+ORDER_SORT_KEYS = ("created_time", "paid_time")
+
 
 @api.route("")
 class OrdersApi(Resource):
     @jwt_required()
     def get(self):
         campus = request.args.get("campus", None)
-        user = request.args.get("user ", None)
+        user = request.args.get("user", None)
         course = request.args.get("course", None)
         paid = request.args.get("paid", None)
         page = int(request.args.get("page", 1))
-        orders = order_service().list_orders(user, course, campus, paid, page)
-        return OrderListSchema(**orders)
+        cursor_args = get_cursor_args(request.args, ORDER_SORT_KEYS, "-created_time")
+        orders = order_service().list_orders(
+            user, course, campus, paid, page, cursor_args=cursor_args
+        )
+        if cursor_args is not None:
+            return serialize(OrderCursorListSchema, orders)
+        return serialize(OrderListSchema, orders)
 
     @jwt_required()
     @validate()
@@ -34,6 +47,37 @@ class OrdersApi(Resource):
         return order_id, 201
 
 
+@api.route("/export")
+class OrdersExportApi(Resource):
+    @jwt_required()
+    def get(self):
+        query_set = order_service().export_orders(
+            request.args.get("user", None),
+            request.args.get("course", None),
+            request.args.get("campus", None),
+            request.args.get("paid", None),
+        )
+        return stream_export(
+            query_set, ORDER_EXPORT_COLUMNS, request.args.get("format", "csv"), "orders"
+        )
+
+
+@api.route(":batch")
+class OrdersBatchApi(Resource):
+    @jwt_required()
+    @validate()
+    def post(self, body: OrderBatchCreateSchema):
+        return {"results": order_service().place_orders(body.orders)}, 200
+
+
+@api.route(":batch/payment")
+class OrdersBatchPaymentApi(Resource):
+    @permission_required("order_admin")
+    @validate()
+    def put(self, body: OrderBatchPaymentSchema):
+        return {"results": order_service().pay_orders(body.orders)}, 200
+
+
 @api.route("/<string:order_id>")
 class OrderApi(Resource):
     @jwt_required()
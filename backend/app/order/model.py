@@ -5,21 +5,55 @@ from mongoengine import (
     CASCADE,
     BooleanField,
     DateTimeField,
+    EmbeddedDocument,
+    EmbeddedDocumentField,
     FloatField,
+    ObjectIdField,
     ReferenceField,
     StringField,
 )
 
+from ..campus.model import Campus
 from ..course.model import Course
 from ..user.model import Student
 
 
+class OrderStudentInfo(EmbeddedDocument):
+    id = ObjectIdField(required=True)
+    username = StringField()
+    display_name = StringField()
+
+
+class OrderCourseInfo(EmbeddedDocument):
+    id = ObjectIdField(required=True)
+    name = StringField()
+    teacher = ObjectIdField()
+
+
 class Order(Document):
     student = ReferenceField(Student, reverse_delete_rule=CASCADE)
     course = ReferenceField(Course, reverse_delete_rule=CASCADE)
+    # Snapshots taken when the order is placed, so listing orders never
+    # dereferences the student, course or campus.
+    campus = ReferenceField(Campus)
+    student_info = EmbeddedDocumentField(OrderStudentInfo)
+    course_info = EmbeddedDocumentField(OrderCourseInfo)
     created_time = DateTimeField(default=datetime.now)
     original_price = FloatField()
     paid = BooleanField(default=False)
     paid_time = DateTimeField()
     paid_comment = StringField()
     paid_price = FloatField()
+
+    meta = {
+        "index_background": True,
+        "indexes": [
+            ("student", "paid"),
+            ("student", "-created_time"),
+            ("course", "-created_time"),
+            ("campus", "-created_time"),
+            ("campus", "paid", "-created_time"),
+            ("paid", "-created_time"),
+            "-created_time",
+        ],
+    }
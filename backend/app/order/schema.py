@@ -1,10 +1,11 @@
 from datetime import datetime
 from typing import List
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 from app.core.type import (
     AllOptional,
+    CursorPaginatedModel,
     MongoListModel,
     MongoModel,
     PaginatedModel,
@@ -36,9 +37,13 @@ class OrderCourseSchema(MongoModel):
 
 
 class OrderDetailSchema(OrderSchema):
+    campus: PydanticObjectId = None
     student: OrderStudentSchema
     course: OrderCourseSchema
 
+    class Config:
+        fields = {"student": "student_info", "course": "course_info"}
+
 
 class OrderCreateSchema(MongoModel):
     student: PydanticObjectId
@@ -56,10 +61,26 @@ class OrderPutSchema(OrderSchema, metaclass=AllOptional):
 
 class OrderPaymentSchema(BaseModel):
     paid: bool = True
-    paid_time: datetime = datetime.utcnow()
+    paid_time: datetime = Field(default_factory=datetime.utcnow)
     paid_comment: str = "No comment"
     paid_price: float = None
 
 
+class OrderBatchCreateSchema(MongoModel):
+    orders: List[OrderCreateSchema]
+
+
+class OrderBatchPaymentItemSchema(OrderPaymentSchema):
+    order: PydanticObjectId
+
+
+class OrderBatchPaymentSchema(BaseModel):
+    orders: List[OrderBatchPaymentItemSchema]
+
+
 class OrderListSchema(PaginatedModel):
     items: List[OrderDetailSchema]
+
+
+class OrderCursorListSchema(CursorPaginatedModel):
+    items: List[OrderDetailSchema]
@@ -1,38 +1,263 @@
+from datetime import timezone
 from typing import List
 
 from flask_jwt_extended import get_current_user
+from pymongo import ReturnDocument, UpdateOne
+from werkzeug.exceptions import BadRequest, NotFound
 
-from app.core.page import paginate
+from app.core.page import paginate, paginate_by_cursor
 from app.core.service import BaseService
+from app.core.transaction import run_in_transaction
 from app.course.model import Course
 from app.exceptions.permission_exceptions import PermissionDenied
-from app.order.model import Order
-from app.order.schema import OrderCreateSchema, OrderPaymentSchema
+from app.order.model import Order, OrderCourseInfo, OrderStudentInfo
+from app.enrollment.service import enroll
+from app.report.service import ROLLUP_ORDER_FIELDS, apply_rollups
+from app.order.schema import (
+    OrderBatchPaymentItemSchema,
+    OrderCreateSchema,
+    OrderDetailSchema,
+    OrderPaymentSchema,
+)
+from app.user import has_permission
 from app.user.model import Student, User
 
+ORDER_BATCH_LIMIT = 1000
+# fields a payment writes; batch items also carry the order id
+PAYMENT_FIELDS = set(OrderPaymentSchema.__fields__)
+# a batch payment only overwrites an order still in the state it was read in
+PAYMENT_GUARD_FIELDS = ("original_price", "paid", "paid_price", "paid_time")
+
+
+def payment_update(payment_info: OrderPaymentSchema) -> dict:
+    """``$set`` stage writing a payment; an omitted paid_price keeps the original price"""
+    payment = {
+        key: {"$literal": value}
+        for key, value in payment_info.dict(include=PAYMENT_FIELDS, exclude={"paid_price"}).items()
+    }
+    payment["paid_price"] = {"$ifNull": [payment_info.paid_price, "$original_price"]}
+    return payment
+
+
+def paid_state(order: dict, payment_info: OrderPaymentSchema) -> dict:
+    """The raw order as ``payment_update`` leaves it, with paid_time as MongoDB stores it"""
+    paid_order = {**order, **payment_info.dict(include=PAYMENT_FIELDS)}
+    if paid_order["paid_price"] is None:
+        paid_order["paid_price"] = order.get("original_price")
+    paid_time = paid_order["paid_time"]
+    if paid_time is not None:
+        if paid_time.tzinfo is not None:
+            paid_time = paid_time.astimezone(timezone.utc).replace(tzinfo=None)
+        paid_order["paid_time"] = paid_time.replace(microsecond=paid_time.microsecond // 1000 * 1000)
+    return paid_order
+
+
+# export column -> raw order field path
+ORDER_EXPORT_COLUMNS = {
+    "id": "_id",
+    "created_time": "created_time",
+    "campus": "campus",
+    "student": "student",
+    "student_username": "student_info.username",
+    "student_display_name": "student_info.display_name",
+    "course": "course",
+    "course_name": "course_info.name",
+    "original_price": "original_price",
+    "paid": "paid",
+    "paid_time": "paid_time",
+    "paid_price": "paid_price",
+    "paid_comment": "paid_comment",
+}
+
+
+STUDENT_SNAPSHOT_FIELDS = ("username", "display_name")
+COURSE_SNAPSHOT_FIELDS = ("name", "campus", "teacher", "original_price")
+
+
+def order_snapshot(student: dict, course: dict) -> dict:
+    """Denormalized Order fields built from raw student and course documents"""
+    return {
+        "campus": course.get("campus"),
+        "student_info": OrderStudentInfo(
+            id=student["_id"],
+            username=student.get("username"),
+            display_name=student.get("display_name"),
+        ),
+        "course_info": OrderCourseInfo(
+            id=course["_id"], name=course.get("name"), teacher=course.get("teacher")
+        ),
+    }
+
 
 class OrderService(BaseService):
     def __init__(self, user):
         super().__init__(OrderService.__name__, user)
 
     def get_order_query(self, **kwargs):
-        if self.user._cls == "User.Admin" and "order_admin" in self.user.permissions:
+        if has_permission(self.user, "order_admin"):
             return Order.objects(**kwargs)
         else:
-            return Order.objects(student=self.user, **kwargs)
+            # students only see their own orders; a filter on anyone else is refused
+            student = kwargs.pop("student", None)
+            if student is not None and str(student) != str(self.user.id):
+                raise PermissionDenied()
+            return Order.objects(student=self.user.id, **kwargs)
 
     def place_order(self, order: OrderCreateSchema) -> Order:
-        if (
-            self.user._cls == "User.Admin" and "order_admin" in self.user.permissions
-        ) or (str(self.user.id) == order.student):
+        if has_permission(self.user, "order_admin") or str(self.user.id) == order.student:
             self.logger.info("Placing orders", order.dict())
-            Student.objects(id=order.student).first_or_404("Student not exists")
-            course = Course.objects(id=order.course).first_or_404("Course not exsists")
-            order.original_price = course.original_price
-            return Order(**order.dict(exclude_none=True)).save()
+            student = (
+                Student.objects(id=order.student).only(*STUDENT_SNAPSHOT_FIELDS).as_pymongo().first()
+            )
+            if student is None:
+                raise NotFound("Student not exists")
+            course = Course.objects(id=order.course).only(*COURSE_SNAPSHOT_FIELDS).as_pymongo().first()
+            if course is None:
+                raise NotFound("Course not exsists")
+            order.original_price = course.get("original_price")
+            return Order(**order.dict(exclude_none=True), **order_snapshot(student, course)).save()
         else:
             raise PermissionDenied()
 
+    def place_orders(self, orders: List[OrderCreateSchema]) -> List[dict]:
+        """Validate and insert many orders with two ``$in`` lookups and one ``insert_many``"""
+        if len(orders) > ORDER_BATCH_LIMIT:
+            raise BadRequest(f"At most {ORDER_BATCH_LIMIT} orders per batch")
+        self.logger.info("Placing orders in batch", {"count": len(orders)})
+        is_order_admin = has_permission(self.user, "order_admin")
+        students = {
+            str(student["_id"]): student
+            for student in Student.objects(id__in=list({order.student for order in orders}))
+            .only(*STUDENT_SNAPSHOT_FIELDS)
+            .as_pymongo()
+        }
+        courses = {
+            str(course["_id"]): course
+            for course in Course.objects(id__in=list({order.course for order in orders}))
+            .only(*COURSE_SNAPSHOT_FIELDS)
+            .as_pymongo()
+        }
+
+        results = []
+        new_orders = []
+        for index, order in enumerate(orders):
+            if not is_order_admin and str(self.user.id) != order.student:
+                results.append({"index": index, "status": 403, "message": "Permission Denied"})
+            elif order.student not in students:
+                results.append({"index": index, "status": 404, "message": "Student not exists"})
+            elif order.course not in courses:
+                results.append({"index": index, "status": 404, "message": "Course not exsists"})
+            else:
+                student, course = students[order.student], courses[order.course]
+                order.original_price = course.get("original_price")
+                new_orders.append(
+                    Order(**order.dict(exclude_none=True), **order_snapshot(student, course))
+                )
+                results.append({"index": index, "status": 201})
+
+        if new_orders:
+            order_ids = iter(Order.objects.insert(new_orders, load_bulk=False))
+            for result in results:
+                if result["status"] == 201:
+                    result["id"] = str(next(order_ids))
+        return results
+
+    def pay_orders(self, payments: List[OrderBatchPaymentItemSchema]) -> List[dict]:
+        """Pay many orders with one ``bulk_write`` per collection"""
+        if len(payments) > ORDER_BATCH_LIMIT:
+            raise BadRequest(f"At most {ORDER_BATCH_LIMIT} orders per batch")
+        self.logger.info("Paying orders in batch", {"count": len(payments)})
+        collection = Order._get_collection()
+
+        def pay(session):
+            orders = {
+                str(order["_id"]): order
+                for order in collection.find(
+                    {"_id": {"$in": list({Order.id.to_mongo(payment.order) for payment in payments})}},
+                    projection=dict.fromkeys(("student", "original_price", *ROLLUP_ORDER_FIELDS), True),
+                    session=session,
+                )
+            }
+            results = []
+            updates = []
+            writes = []
+            seen = set()
+            for index, payment in enumerate(payments):
+                order = orders.get(payment.order)
+                if payment.order in seen:
+                    results.append({"index": index, "status": 400, "message": "Order repeated in batch"})
+                elif order is None:
+                    results.append({"index": index, "status": 404, "message": "Order not exists"})
+                else:
+                    seen.add(payment.order)
+                    paid_order = paid_state(order, payment)
+                    # the write only applies to the state the rollup delta is taken from
+                    updates.append(
+                        UpdateOne(
+                            {"_id": order["_id"], **{field: order.get(field) for field in PAYMENT_GUARD_FIELDS}},
+                            {"$set": {field: paid_order[field] for field in PAYMENT_FIELDS}},
+                        )
+                    )
+                    writes.append((index, order, paid_order))
+                    results.append({"index": index, "id": payment.order, "status": 200})
+
+            if updates:
+                result = collection.bulk_write(updates, ordered=False, session=session)
+                if result.matched_count < len(writes):
+                    writes = self._matched_payments(writes, results, session)
+            enroll(
+                [(order["student"], order["course"]) for _, order, paid_order in writes if paid_order["paid"]],
+                session=session,
+            )
+            apply_rollups([(order, paid_order) for _, order, paid_order in writes], session=session)
+            return results
+
+        return run_in_transaction(pay)
+
+    @staticmethod
+    def _matched_payments(writes, results, session):
+        """The writes of a batch that landed; the rest lost to a concurrent payment of their order"""
+        current = {
+            order["_id"]: order
+            for order in Order._get_collection().find(
+                {"_id": {"$in": [order["_id"] for _, order, _ in writes]}},
+                projection=dict.fromkeys(PAYMENT_FIELDS, True),
+                session=session,
+            )
+        }
+        matched = []
+        for index, order, paid_order in writes:
+            stored = current.get(order["_id"], {})
+            if all(stored.get(field) == paid_order[field] for field in PAYMENT_FIELDS):
+                matched.append((index, order, paid_order))
+            else:
+                results[index] = {
+                    "index": index,
+                    "status": 409,
+                    "message": "Order was changed by another payment",
+                }
+        return matched
+
+    @staticmethod
+    def _order_filters(user=None, course=None, campus=None, paid=None) -> dict:
+        querys = {}
+        if user is not None:
+            querys["student"] = user
+        if course is not None:
+            querys["course"] = course
+        if campus is not None:
+            querys["campus"] = campus
+        if paid is not None:
+            querys["paid"] = paid.lower() == "true"
+        return querys
+
+    def export_orders(
+        self, user: str = None, course: str = None, campus: str = None, paid: str = None
+    ):
+        self.logger.info("Exporting orders")
+        querys = self._order_filters(user, course, campus, paid)
+        return self.get_order_query(**querys).order_by("-created_time")
+
     def list_orders(
         self,
         user: str = None,
@@ -40,36 +265,66 @@ class OrderService(BaseService):
         campus: str = None,
         paid: str = None,
         page: int = 1,
+        cursor_args: dict = None,
     ) -> List[Order]:
         self.logger.info("Fetching orders")
-        querys = {}
-        if user is not None:
-            querys["user"] = user
-        if course is not None:
-            querys["course"] = course
-        if campus is not None:
-            querys["campus"] = campus
-        if paid is not None:
-            querys["paid"] = paid.lower() == "true"
-        return paginate(self.get_order_query(**querys), page_num=page)
+        querys = self._order_filters(user, course, campus, paid)
+        if cursor_args is not None:
+            # unpaid orders have no paid_time, and the keyset cannot page from dates into nulls
+            if cursor_args["sort"].lstrip("-") == "paid_time" and querys.get("paid") is not True:
+                raise BadRequest("Sorting by paid_time requires paid=true")
+            return paginate_by_cursor(
+                self.get_order_query(**querys),
+                cursor=cursor_args["cursor"],
+                limit=cursor_args["limit"],
+                sort_key=cursor_args["sort"],
+                schema=OrderDetailSchema,
+                total=cursor_args["total"],
+            )
+        return paginate(
+            self.get_order_query(**querys), page_num=page, schema=OrderDetailSchema
+        )
 
     def get_order(self, order_id) -> Order:
         return self.get_order_query(id=order_id).first_or_404("Order not exists")
 
     def delete_order(self, order_id) -> int:
-        order = Order.objects(id=order_id).first_or_404("Order not exists")
-        return order.delete()
+        def delete(session):
+            order = Order._get_collection().find_one_and_delete(
+                {"_id": Order.id.to_mongo(order_id)},
+                projection=dict.fromkeys(ROLLUP_ORDER_FIELDS, True),
+                session=session,
+            )
+            if order is not None:
+                apply_rollups([(order, None)], session=session)
+            return order
+
+        if run_in_transaction(delete) is None:
+            raise NotFound("Order not exists")
 
     def pay_order(self, order_id, payment_info: OrderPaymentSchema):
-        order: Order = Order.objects(id=order_id).first_or_404("Order not exists")
-        if payment_info.paid_price is None:
-            payment_info.paid_price = order.original_price
-        order_updated = order.update(**payment_info.dict())
-        order.reload()
-        if order.paid:
-            order.course.update(add_to_set__enrolled_students=order.student)
-            order.student.update(add_to_set__enrolled_courses=order.course)
-        return order_updated
+        """Apply the payment in one round trip, then enroll and update the rollups by id"""
+
+        def pay(session):
+            # the previous state is returned so the rollups can move by the difference
+            order = Order._get_collection().find_one_and_update(
+                {"_id": Order.id.to_mongo(order_id)},
+                [{"$set": payment_update(payment_info)}],
+                projection=dict.fromkeys(("student", "original_price", *ROLLUP_ORDER_FIELDS), True),
+                return_document=ReturnDocument.BEFORE,
+                session=session,
+            )
+            if order is None:
+                return None
+            paid_order = paid_state(order, payment_info)
+            if paid_order["paid"]:
+                enroll([(order["student"], order["course"])], session=session)
+            apply_rollups([(order, paid_order)], session=session)
+            return order
+
+        if run_in_transaction(pay) is None:
+            raise NotFound("Order not exists")
+        return 1
 
 
 def order_service():
@@ -0,0 +1,17 @@
+from flask import request
+from flask_restx import Namespace, Resource
+
+from app.report.schema import RollupListSchema
+from app.report.service import report_service
+from app.user import permission_required
+
+api = Namespace("reports")
+
+
+@api.route("/orders/<string:dimension>")
+class OrderRollupApi(Resource):
+    @permission_required("order_admin")
+    def get(self, dimension):
+        start = request.args.get("start", None)
+        end = request.args.get("end", None)
+        return RollupListSchema.parse_obj(report_service().list_rollups(dimension, start, end))
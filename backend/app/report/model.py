@@ -0,0 +1,20 @@
+from datetime import datetime
+
+from flask_mongoengine import Document
+from mongoengine import DateTimeField, FloatField, IntField, StringField
+
+
+class OrderRollup(Document):
+    """Paid order totals for one key of one dimension (campus, course, teacher or day)"""
+
+    dimension = StringField(required=True)
+    key = StringField(required=True)
+    paid_count = IntField(default=0)
+    paid_total = FloatField(default=0.0)
+    updated_time = DateTimeField(default=datetime.utcnow)
+
+    meta = {
+        "collection": "order_rollup",
+        "index_background": True,
+        "indexes": [{"fields": ["dimension", "key"], "unique": True}],
+    }
@@ -0,0 +1,23 @@
+from typing import List
+
+from pydantic import root_validator
+
+from app.core.type import MongoListModel, MongoModel
+
+
+class RollupSchema(MongoModel):
+    key: str
+    name: str = None
+    paid_count: int
+    paid_total: float
+    average_paid_price: float = None
+
+    @root_validator(skip_on_failure=True)
+    def compute_average(cls, values):
+        if values["paid_count"]:
+            values["average_paid_price"] = values["paid_total"] / values["paid_count"]
+        return values
+
+
+class RollupListSchema(MongoListModel):
+    __root__: List[RollupSchema]
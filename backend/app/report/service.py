@@ -0,0 +1,188 @@
+from collections import defaultdict
+from datetime import datetime
+
+from bson import ObjectId
+from flask_jwt_extended import get_current_user
+from pymongo import UpdateOne
+from werkzeug.exceptions import BadRequest
+
+from app.campus.model import Campus
+from app.core.service import BaseService
+from app.core.transaction import run_in_transaction
+from app.course.model import Course
+from app.exceptions.permission_exceptions import PermissionDenied
+from app.report.model import OrderRollup
+from app.user import has_permission
+from app.user.model import Teacher
+
+DAY_FORMAT = "%Y-%m-%d"
+
+# How each rollup dimension keys a raw order document
+ROLLUP_DIMENSIONS = {
+    "campus": lambda order: order.get("campus"),
+    "course": lambda order: order.get("course"),
+    "teacher": lambda order: (order.get("course_info") or {}).get("teacher"),
+    "day": lambda order: order["paid_time"].strftime(DAY_FORMAT) if order.get("paid_time") else None,
+}
+
+# Group keys for rebuilding each dimension from the orders collection
+ROLLUP_GROUP_KEYS = {
+    "campus": "$campus",
+    "course": "$course",
+    "teacher": "$course_info.teacher",
+    "day": {"$dateToString": {"format": DAY_FORMAT, "date": "$paid_time"}},
+}
+
+ROLLUP_NAMES = {
+    "campus": (Campus, "name"),
+    "course": (Course, "name"),
+    "teacher": (Teacher, "display_name"),
+}
+
+# Order fields the rollups are derived from
+ROLLUP_ORDER_FIELDS = ("campus", "course", "course_info", "paid", "paid_price", "paid_time")
+
+
+def rollup_deltas(changes) -> dict:
+    """Sum the rollup changes of (before, after) raw order pairs; either side may be None"""
+    deltas = defaultdict(lambda: [0, 0.0])
+    for before, after in changes:
+        for order, sign in ((before, -1), (after, 1)):
+            if not order or not order.get("paid"):
+                continue
+            for dimension, key_of in ROLLUP_DIMENSIONS.items():
+                key = key_of(order)
+                if key is not None:
+                    delta = deltas[(dimension, str(key))]
+                    delta[0] += sign
+                    delta[1] += sign * (order.get("paid_price") or 0.0)
+    return deltas
+
+
+def apply_rollups(changes, session=None):
+    """Apply the rollup changes of (before, after) order pairs with one ``bulk_write``"""
+    now = datetime.utcnow()
+    updates = [
+        UpdateOne(
+            {"dimension": dimension, "key": key},
+            {"$inc": {"paid_count": count, "paid_total": total}, "$set": {"updated_time": now}},
+            upsert=True,
+        )
+        for (dimension, key), (count, total) in rollup_deltas(changes).items()
+        if count or total
+    ]
+    if updates:
+        OrderRollup._get_collection().bulk_write(updates, ordered=False, session=session)
+
+
+def delete_orders(**filters) -> int:
+    """Delete the matching orders and take the paid ones out of the rollups.
+
+    Call before deleting a student or course, whose CASCADE rule would
+    otherwise drop their orders without touching the rollups. Without
+    transaction support, a payment racing the deletion can leave the rollups
+    off until ``manage.py rebuild-rollups``.
+    """
+    from app.order.model import Order
+
+    collection = Order._get_collection()
+    query = Order.objects(**filters)._query
+
+    def delete(session):
+        orders = list(
+            collection.find(query, projection=dict.fromkeys(ROLLUP_ORDER_FIELDS, True), session=session)
+        )
+        if not orders:
+            return 0
+        collection.delete_many({"_id": {"$in": [order["_id"] for order in orders]}}, session=session)
+        apply_rollups([(order, None) for order in orders], session=session)
+        return len(orders)
+
+    return run_in_transaction(delete)
+
+
+def rebuild_rollups():
+    """Recompute every rollup from the paid orders with one aggregation per dimension"""
+    from app.order.model import Order
+
+    now = datetime.utcnow()
+    collection = OrderRollup._get_collection()
+    rebuilt = {}
+    for dimension, group_key in ROLLUP_GROUP_KEYS.items():
+        rows = Order._get_collection().aggregate(
+            [
+                {"$match": {"paid": True}},
+                {
+                    "$group": {
+                        "_id": group_key,
+                        "paid_count": {"$sum": 1},
+                        "paid_total": {"$sum": {"$ifNull": ["$paid_price", 0]}},
+                    }
+                },
+                {"$match": {"_id": {"$ne": None}}},
+            ]
+        )
+        rollups = [
+            {
+                "dimension": dimension,
+                "key": str(row["_id"]),
+                "paid_count": row["paid_count"],
+                "paid_total": float(row["paid_total"]),
+                "updated_time": now,
+            }
+            for row in rows
+        ]
+        collection.delete_many({"dimension": dimension})
+        if rollups:
+            collection.insert_many(rollups)
+        rebuilt[dimension] = len(rollups)
+    return rebuilt
+
+
+class ReportService(BaseService):
+    def __init__(self, user) -> None:
+        super().__init__(ReportService.__name__, user)
+
+    def list_rollups(self, dimension: str, start: str = None, end: str = None):
+        if not has_permission(self.user, "order_admin"):
+            raise PermissionDenied("Permission 'order_admin' is required")
+        if dimension not in ROLLUP_DIMENSIONS:
+            raise BadRequest(f"Unknown report '{dimension}'")
+        self.logger.info("Fetching order rollups", {"dimension": dimension})
+
+        querys = {"dimension": dimension}
+        if dimension == "day":
+            for value in (start, end):
+                if value is not None:
+                    try:
+                        datetime.strptime(value, DAY_FORMAT)
+                    except ValueError:
+                        raise BadRequest(f"Dates must be formatted as {DAY_FORMAT}")
+            if start is not None:
+                querys["key__gte"] = start
+            if end is not None:
+                querys["key__lte"] = end
+            order_by = "key"
+        else:
+            order_by = "-paid_total"
+
+        rollups = list(
+            OrderRollup.objects(**querys)
+            .only("key", "paid_count", "paid_total")
+            .order_by(order_by)
+            .as_pymongo()
+        )
+        if dimension in ROLLUP_NAMES:
+            document, name_field = ROLLUP_NAMES[dimension]
+            ids = [ObjectId(rollup["key"]) for rollup in rollups if ObjectId.is_valid(rollup["key"])]
+            names = {
+                str(row["_id"]): row.get(name_field)
+                for row in document.objects(id__in=ids).only(name_field).as_pymongo()
+            }
+            for rollup in rollups:
+                rollup["name"] = names.get(rollup["key"])
+        return rollups
+
+
+def report_service():
+    return ReportService(get_current_user())
@@ -1,28 +1,197 @@
-from flask_jwt_extended import current_user, jwt_required
+import calendar
+import time
+from datetime import datetime
+
+from bson import ObjectId
+from flask_jwt_extended import current_user, get_jwt, jwt_required
+from werkzeug.local import LocalProxy
 from .model import User
 import functools
+from app.core.cache import TTLCache, shared_versions
 from app.exceptions.permission_exceptions import PermissionDenied
 from .model import Admin, Student, Teacher, User
 
-def register_user_lookup(jwt):
+USER_CACHE_TTL = 60
+USER_CACHE_SIZE = 4096
+
+user_cache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+# per user: ms instants up to which access / all tokens are revoked, or None once deleted
+revocation_cache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+
+
+def _user_version_key(user_id):
+    return f"user:{user_id}"
+
+
+def _token_version_key(user_id, token_type):
+    return f"tokens:{token_type}:{user_id}"
+
+
+def invalidate_user(user_id):
+    """Drop the cached lookup of ``user_id`` in this and every other worker"""
+    shared_versions.bump(_user_version_key(user_id))
+    user_cache.pop(str(user_id))
+
+
+def revoke_tokens(user_id, sessions=False):
+    """Reject the access tokens of ``user_id`` issued so far.
+
+    The client then refreshes to get current claims; with ``sessions`` the
+    refresh tokens are rejected as well and the user has to log in again.
+    The revocation is stored on the user, which every host re-reads within
+    ``USER_CACHE_TTL``; the host-local markers apply it here at once.
+    """
+    now = datetime.utcnow()
+    # MongoDB keeps milliseconds; store exactly what is compared against iat_ms
+    now = now.replace(microsecond=now.microsecond // 1000 * 1000)
+    field = "tokens_valid_after" if sessions else "access_valid_after"
+    User.objects(id=user_id).update_one(**{f"set__{field}": now})
+    revocation_cache.pop(str(user_id))
+    if sessions:
+        shared_versions.bump(_token_version_key(user_id, "refresh"))
+    shared_versions.bump(_token_version_key(user_id, "access"))
+
+
+def token_revocations(user_id):
+    """``{token type: revoked up to (ms)}`` of ``user_id``, or None for a deleted user"""
+    revocations = revocation_cache.get(user_id, False)
+    if revocations is False:
+        user = (
+            User.objects(id=user_id)
+            .only("access_valid_after", "tokens_valid_after")
+            .as_pymongo()
+            .first()
+        )
+        revocations = user and {
+            "access": epoch_ms(user.get("access_valid_after")),
+            "refresh": epoch_ms(user.get("tokens_valid_after")),
+        }
+        revocation_cache.set(user_id, revocations)
+    return revocations
+
+
+def epoch_ms(value: datetime) -> int:
+    if value is None:
+        return 0
+    return calendar.timegm(value.utctimetuple()) * 1000 + value.microsecond // 1000
+
+
+def issued_before(jwt_data, revoked_ms: int) -> bool:
+    """Whether the token was issued no later than ``revoked_ms``, to the millisecond.
+
+    Tokens from before the ``iat_ms`` claim only carry whole seconds, so one
+    from the revoking second itself counts as issued before it.
+    """
+    return revoked_ms > 0 and jwt_data.get("iat_ms", jwt_data["iat"] * 1000) <= revoked_ms
+
+
+def token_claims(user: User) -> dict:
+    """Role and permissions carried by access tokens, so authorization needs no user lookup"""
+    return {
+        "role": user._cls.split(".")[-1].lower(),
+        "perms": list(getattr(user, "permissions", None) or []),
+    }
+
+
+def user_claims(user: User) -> dict:
+    """Claims of ``user``, from the request's access token when it is theirs"""
+    try:
+        claims = get_jwt()
+    except RuntimeError:
+        claims = {}
+    # tokens issued before claims existed fall back to the user document
+    if "role" in claims and claims["sub"] == str(user.id):
+        return claims
+    return token_claims(user)
+
+
+def user_role(user: User) -> str:
+    return user_claims(user)["role"]
+
+
+def has_permission(user: User, permission) -> bool:
+    """Whether ``user`` is an admin holding ``permission``"""
+    claims = user_claims(user)
+    return claims["role"] == "admin" and permission in claims["perms"]
+
+
+class LazyUser(LocalProxy):
+    """``current_user`` that is only fetched once something needs more than its id"""
+
+    def __init__(self, identity, load) -> None:
+        loaded = []
+
+        def get_user():
+            if not loaded:
+                loaded.append(load(identity))
+            return loaded[0]
+
+        super().__init__(get_user)
+        object.__setattr__(self, "_identity", identity)
+
+    @property
+    def id(self):
+        return ObjectId(object.__getattribute__(self, "_identity"))
+
+
+def register_user_lookup(jwt, app):
+    for cache in (user_cache, revocation_cache):
+        cache.configure(
+            maxsize=int(app.config.get("USER_CACHE_SIZE", USER_CACHE_SIZE)),
+            ttl=int(app.config.get("USER_CACHE_TTL", USER_CACHE_TTL)),
+        )
+
+    def load_user(identity):
+        # the version is read before the fetch, so a concurrent invalidation
+        # makes the freshly cached entry stale instead of being lost
+        version = shared_versions.version(_user_version_key(identity))
+        cached = user_cache.get(identity)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        user = User.objects(id=identity).first_or_404(message="User not found")
+        user_cache.set(identity, (version, user))
+        return user
+
     def user_lookup_callback(__jwt_header,jwt_data):
-        identity = jwt_data['sub']
+        return LazyUser(jwt_data['sub'], load_user)
+
+    def token_revoked_callback(__jwt_header,jwt_data):
+        user_id = jwt_data["sub"]
+        token_types = ("access", "refresh") if jwt_data["type"] == "access" else ("refresh",)
+        # revocations made on this host show up at once through the markers
+        revoked_at = max(
+            shared_versions.version(_token_version_key(user_id, token_type))
+            for token_type in token_types
+        )
+        if issued_before(jwt_data, revoked_at // 10**6):
+            return True
+        # the ones from other hosts, or from before a restart, within USER_CACHE_TTL
+        revocations = token_revocations(user_id)
+        if revocations is None:
+            return True
+        return issued_before(jwt_data, max(revocations[token_type] for token_type in token_types))
+
+    def token_issue_claims(identity):
+        # iat has whole seconds; a token refreshed in the second of a revocation must still pass
+        return {"iat_ms": time.time_ns() // 10**6}
 
-        return User.objects(id=identity).first_or_404(message="User not found")
-    
     jwt.user_lookup_loader(user_lookup_callback)
+    jwt.token_in_blocklist_loader(token_revoked_callback)
+    jwt.additional_claims_loader(token_issue_claims)
 
 def permission_required(permission=None):
     def wrapper(func):
         @jwt_required()
         @functools.wraps(func)
         def decorator(*arg, **kwargs):
-            if current_user._cls == "User.Admin":
-                if permission is None or permission in current_user.permissions:
+            claims = user_claims(current_user)
+            if claims["role"] == "admin":
+                if permission is None or permission in claims["perms"]:
                     return func(*arg, **kwargs)
                 else:
                     raise PermissionDenied(f"Permission '{permission}' is required")
-            elif current_user._cls == "User.Teacher":
+            elif claims["role"] == "teacher":
                 return func(*arg, **kwargs)
             raise PermissionDenied()
         return decorator
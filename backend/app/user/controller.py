@@ -1,23 +1,38 @@
-import datetime
 from flask_restx import Namespace,Resource
 from flask import jsonify, request
 from flask_jwt_extended import (
     create_access_token,
+    create_refresh_token,
     set_access_cookies,
+    set_refresh_cookies,
     jwt_required,
-    current_user
+    current_user,
+    get_jwt,
+    get_jwt_header,
 )
+from flask_jwt_extended.exceptions import RevokedTokenError
 
 from app.campus.model import Campus
-from app.user import permission_required
-from app.user.service import unauthorized_user_service, user_service
+from app.user import epoch_ms, invalidate_user, issued_before, permission_required, token_claims
+from app.core.etag import conditional_response
+from app.core.export import stream_export
+from app.core.page import get_cursor_args
+from app.core.type import cursor_page_schema
+from app.user.service import (
+    USER_EXPORT_COLUMNS,
+    USER_EXPORT_CONVERTERS,
+    unauthorized_user_service,
+    user_service,
+)
 
-from .model import Admin, Teacher, User,check_password,get_hashed_password,Student
+from .model import Admin, Teacher, User,check_password,get_hashed_password,password_needs_rehash,Student
 from .schema import (
     AdminCreateSchema,
     AdminListSchema,
     AdminSchema,
     StudentCreateSchema,
+    StudentEnrolledIdsListSchema,
+    StudentEnrolledIdsSchema,
     StudentListSchema,
     StudentSchema,
     TeacherCreateSchema,
@@ -27,13 +42,17 @@ from .schema import (
     UserSchema,
 )
 
+USER_SORT_KEYS = ("created_at", "username")
+
 auth_api=Namespace("auth")
 
 @auth_api.route("")
 class UserInfo(Resource):
     @jwt_required()
     def get(self):
-        return current_user.to_dict()
+        return conditional_response(
+            user_service().user_etag(current_user.id), current_user.to_dict
+        )
 
 @auth_api.route("/login")
 class Login(Resource):
@@ -49,11 +68,31 @@ class Login(Resource):
         user = user_list[0]
         if not check_password(password, user.password):
             return {"code": 401, "message": "Username or Password is incorrect"}, 401
+        if password_needs_rehash(user.password):
+            user.update(password=get_hashed_password(password), inc__version=1)
+            invalidate_user(user.id)
         
+        # access tokens are short lived (JWT_ACCESS_TOKEN_EXPIRES) and carry the
+        # role and permissions; the refresh token renews them from the database
+        jwt_token=create_access_token(identity=str(user.id),additional_claims=token_claims(user))
+        refresh_token=create_refresh_token(identity=str(user.id))
+
+        response=jsonify({"access_token":jwt_token,"refresh_token":refresh_token})
+        set_access_cookies(response,jwt_token)
+        set_refresh_cookies(response,refresh_token)
+        return response
+
+@auth_api.route("/refresh")
+class Refresh(Resource):
+    @jwt_required(refresh=True)
+    def post(self):
+        # read fresh, as revocations from other hosts or before a restart are only stored here
+        user=User.objects(id=current_user.id).first_or_404(message="User not found")
+        if issued_before(get_jwt(),epoch_ms(user.tokens_valid_after)):
+            raise RevokedTokenError(get_jwt_header(),get_jwt())
         jwt_token=create_access_token(
-            identity=str(user.id),expires_delta=datetime.timedelta(days=30)
+            identity=str(user.id),additional_claims=token_claims(user)
         )
-
         response=jsonify({"access_token":jwt_token})
         set_access_cookies(response,jwt_token)
         return response
@@ -69,7 +108,20 @@ class UsersApi(Resource):
         if campus is not None:
             campus = Campus.objects(id=campus).first_or_404("Campus not found")
 
-        user_list = user_service().list_users(user_type=user_type, campus=campus)
+        cursor_args = get_cursor_args(request.args, USER_SORT_KEYS, "created_at")
+        enrolled_ids = request.args.get("enrolled", "full") == "ids"
+        service = user_service()
+        user_list = service.list_users(
+            user_type=user_type,
+            campus=campus,
+            cursor_args=cursor_args,
+            enrolled_ids=enrolled_ids,
+        )
+        schema = service.user_schema(user_type, enrolled_ids)
+        if cursor_args is not None:
+            return cursor_page_schema(schema)(**user_list)
+        if schema is StudentEnrolledIdsSchema:
+            return StudentEnrolledIdsListSchema.from_orm(user_list)
         if user_type == "admin":
             return AdminListSchema.from_orm(user_list)
         if user_type == "teacher":
@@ -79,6 +131,23 @@ class UsersApi(Resource):
         else:
             return UserListSchema.from_orm(user_list)
         
+@users_api.route("/export")
+class UsersExportApi(Resource):
+    @permission_required("user_admin")
+    def get(self):
+        user_type = request.args.get("type", None)
+        campus = request.args.get("campus", None)
+        if campus is not None:
+            campus = Campus.objects(id=campus).first_or_404("Campus not found")
+        query_set = user_service().export_users(user_type=user_type, campus=campus)
+        return stream_export(
+            query_set,
+            USER_EXPORT_COLUMNS,
+            request.args.get("format", "csv"),
+            "users",
+            converters=USER_EXPORT_CONVERTERS,
+        )
+
 @users_api.route("/<username>")
 class UsersApi(Resource):
     def put(self,username):
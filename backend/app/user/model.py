@@ -3,9 +3,12 @@ import bcrypt
 import base64
 from datetime import datetime
 
+from flask import current_app, has_app_context
 from flask_mongoengine import Document
-from mongoengine import StringField,ReferenceField,CASCADE,ListField,DateTimeField
+from mongoengine import StringField,ReferenceField,CASCADE,ListField,DateTimeField,IntField
 from app.campus.model import Campus
+from app.core.metrics import timed
+from app.core.pool import bcrypt_pool
 from .schema import (
     AdminSchema,
     AdminPutSchema,
@@ -16,17 +19,36 @@ from .schema import (
     UserPutSchema,
     UserSchema,
 )
+BCRYPT_ROUNDS = 12
+
+def get_bcrypt_rounds():
+    if has_app_context():
+        return int(current_app.config.get("BCRYPT_ROUNDS", BCRYPT_ROUNDS))
+    return BCRYPT_ROUNDS
+
 def get_hashed_password(plain_text_password):
-    return bcrypt.hashpw(
-        base64.b64encode(hashlib.sha256(plain_text_password.encode("utf-8")).digest()),
-        bcrypt.gensalt(),
-    ).decode("utf-8")
+    with timed("bcrypt"):
+        return bcrypt_pool.run(
+            bcrypt.hashpw,
+            base64.b64encode(hashlib.sha256(plain_text_password.encode("utf-8")).digest()),
+            bcrypt.gensalt(get_bcrypt_rounds()),
+        ).decode("utf-8")
 
 def check_password(plain_text_password,hashed_password):
-    return bcrypt.checkpw(
-        base64.b64encode(hashlib.sha256(plain_text_password.encode("utf-8")).digest()),
-        hashed_password.encode("utf-8"),
-    )
+    with timed("bcrypt"):
+        return bcrypt_pool.run(
+            bcrypt.checkpw,
+            base64.b64encode(hashlib.sha256(plain_text_password.encode("utf-8")).digest()),
+            hashed_password.encode("utf-8"),
+        )
+
+def password_needs_rehash(hashed_password):
+    # bcrypt hashes look like $2b$<rounds>$<salt+hash>
+    try:
+        rounds = int(hashed_password.split("$")[2])
+    except (IndexError, ValueError):
+        return True
+    return rounds != get_bcrypt_rounds()
 
 class User(Document):
     username = StringField(required=True,unique=True,max_length=36)
@@ -34,10 +56,15 @@ class User(Document):
     display_name = StringField()
     telephone=StringField()
     campus=ReferenceField(Campus,reverse_delete_rule=CASCADE)
-    created_at= DateTimeField(default=datetime.utcnow())
+    created_at= DateTimeField(default=datetime.utcnow)
+    version=IntField(default=0)
+    # tokens issued up to these instants are revoked (access ones only / all), see app.user.revoke_tokens
+    access_valid_after=DateTimeField()
+    tokens_valid_after=DateTimeField()
     meta={
         "allow_inheritance":True,
-        "indexes":["username","campus"],
+        "index_background":True,
+        "indexes":["username","campus","created_at",("campus","created_at")],
         }
     
     def to_dict(self):
@@ -47,12 +74,24 @@ class User(Document):
         if len(kwargs) == 0:
             return
         user = UserPutSchema(**kwargs)
-        self.update(**user.dict(exclude_defaults=True, exclude_none=True))
+        self.update(inc__version=1, **user.dict(exclude_defaults=True, exclude_none=True))
 
 class Student(User):
     wx=StringField()
     uni=StringField()
-    enrolled_courses = ListField(ReferenceField("Course"), default=[])
+    # Superseded by the Enrollment collection, see Course.legacy_enrolled_students
+    legacy_enrolled_courses = ListField(
+        ReferenceField("Course"), db_field="enrolled_courses", default=[]
+    )
+
+    @property
+    def enrolled_courses(self):
+        prefetched = self.__dict__.get("_prefetched_enrolled_courses")
+        if prefetched is not None:
+            return prefetched
+        from app.enrollment.service import enrolled_courses
+
+        return enrolled_courses([self.id])[self.id]
 
     def to_dict(self):
         return StudentSchema.from_orm(self).dict()
@@ -61,7 +100,7 @@ class Student(User):
         if len(kwargs) == 0:
             return
         user = StudentPutSchema(**kwargs)
-        self.update(**user.dict(exclude_defaults=True, exclude_none=True))
+        self.update(inc__version=1, **user.dict(exclude_defaults=True, exclude_none=True))
 
 class Admin(User):
     permissions=ListField(StringField(),required=True,default=[])
@@ -73,7 +112,7 @@ class Admin(User):
         if len(kwargs) == 0:
             return
         user = AdminPutSchema(**kwargs)
-        self.update(**user.dict(exclude_defaults=True, exclude_none=True))
+        self.update(inc__version=1, **user.dict(exclude_defaults=True, exclude_none=True))
 
 class Teacher(User):
     abn=StringField(max_length=20)
@@ -85,4 +124,4 @@ class Teacher(User):
         if len(kwargs) == 0:
             return
         user = TeacherPutSchema(**kwargs)
-        self.update(**user.dict(exclude_defaults=True, exclude_none=True))
+        self.update(inc__version=1, **user.dict(exclude_defaults=True, exclude_none=True))
@@ -13,7 +13,7 @@ class UserCampusSchema(MongoModel):
 class UserSchema(MongoModel):
     id:PydanticObjectId
     username:str
-    password:SecretStr
+    password:SecretStr = None
     display_name:str
     telephone:str
     campus:PydanticObjectId
@@ -49,8 +49,14 @@ class UserListSchema(MongoListModel):
 class StudentSchema(UserSchema):
     wx: str = None
     uni: str = None
-    enrolled_courses: List[CourseBasicInfoSchema]
+    enrolled_courses: List[CourseBasicInfoSchema] = []
     
+class StudentEnrolledIdsSchema(StudentSchema):
+    enrolled_courses: List[PydanticObjectId] = []
+
+class StudentEnrolledIdsListSchema(MongoListModel):
+    __root__: List[StudentEnrolledIdsSchema]
+
 class StudentCreateSchema(UserCreateSchema):
     wx: str = None
     uni: str =None
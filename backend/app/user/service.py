@@ -1,25 +1,94 @@
-from typing import List
-
 from flask_jwt_extended import get_current_user
 
 from app.core.service import BaseService
-from .model import Campus,User, get_hashed_password
+from app.core.page import paginate_by_cursor
+from app.core.type import project, resolve_references
+from app.core.etag import make_etag
+from app.core.response_cache import response_cache
+from app.core.storage import signed_url_epoch
+from app.course.model import Course
+from app.enrollment.service import enrolled_course_ids, prefetch_enrolled_courses
+from app.report.service import delete_orders
+from app.user import has_permission, invalidate_user, revoke_tokens
+from .model import Campus, Student, Teacher, User, get_hashed_password
 from mongoengine.errors import NotUniqueError
+from werkzeug.exceptions import NotFound
 from app.exceptions.database_exceptions import DuplicateRecord
 from app.exceptions.permission_exceptions import PermissionDenied
+from .schema import (
+    AdminSchema,
+    StudentEnrolledIdsSchema,
+    StudentSchema,
+    TeacherSchema,
+    UserSchema,
+)
+
+USER_SCHEMAS = {"admin": AdminSchema, "teacher": TeacherSchema, "student": StudentSchema}
+
+# export column -> raw user field path; the password hash is never exported
+USER_EXPORT_COLUMNS = {
+    "id": "_id",
+    "username": "username",
+    "display_name": "display_name",
+    "telephone": "telephone",
+    "campus": "campus",
+    "user_type": "_cls",
+    "created_at": "created_at",
+}
+USER_EXPORT_CONVERTERS = {"user_type": lambda value: value.split(".")[-1].lower()}
 
 class UserService(BaseService):
     def __init__(self, user) -> None:
         super().__init__(UserService.__name__, user)
 
-    def list_users(self, user_type: str = None, campus: Campus = None) -> List[User]:
-        self.logger.info("Fetching users")
+    @staticmethod
+    def _user_query(user_type: str = None, campus: Campus = None):
         querys = {}
         if user_type is not None:
             querys["_cls"] = "User." + user_type.lower().capitalize()
         if campus is not None:
             querys["campus"] = campus
-        return list(User.objects(**querys))
+        return User.objects(**querys)
+
+    def export_users(self, user_type: str = None, campus: Campus = None):
+        self.logger.info("Exporting users")
+        return self._user_query(user_type, campus).order_by("id")
+
+    @staticmethod
+    def user_schema(user_type: str = None, enrolled_ids: bool = False):
+        schema = UserSchema
+        if user_type is not None:
+            schema = USER_SCHEMAS.get(user_type.lower(), UserSchema)
+        if schema is StudentSchema and enrolled_ids:
+            schema = StudentEnrolledIdsSchema
+        return schema
+
+    def list_users(
+        self,
+        user_type: str = None,
+        campus: Campus = None,
+        cursor_args: dict = None,
+        enrolled_ids: bool = False,
+    ):
+        self.logger.info("Fetching users")
+        schema = self.user_schema(user_type, enrolled_ids)
+        query_set = self._user_query(user_type, campus)
+        if cursor_args is not None:
+            page = paginate_by_cursor(
+                query_set,
+                cursor=cursor_args["cursor"],
+                limit=cursor_args["limit"],
+                sort_key=cursor_args["sort"],
+                schema=schema,
+                total=cursor_args["total"],
+            )
+            users = page["items"]
+        else:
+            page = None
+            users = resolve_references(project(query_set, schema), schema)
+        if issubclass(schema, StudentSchema):
+            prefetch_enrolled_courses(users, ids_only=enrolled_ids)
+        return users if page is None else page
     
     def register_user(self, user: User):
         try:
@@ -30,19 +99,21 @@ class UserService(BaseService):
             raise DuplicateRecord("User already exists")
     
     def get_user(self, username) -> User:
-        if self.user.username == username or (
-            self.user._cls == "User.Admin" and "user_admin" in self.user.permissions
-        ):
+        if self.user.username == username or has_permission(self.user, "user_admin"):
             return User.objects(username=username).first_or_404("User not exists")
         else:
             raise PermissionDenied()
 
     def delete_user(self, username):
-        if self.user.username == username or (
-            self.user._cls == "User.Admin" and "user_admin" in self.user.permissions
-        ):
+        if self.user.username == username or has_permission(self.user, "user_admin"):
             user = User.objects(username=username).first_or_404("User not exists")
+            if isinstance(user, Student):
+                # The cascade drops their enrollments, which changes each course's count
+                Course.objects(id__in=enrolled_course_ids(user.id)).update(inc__version=1)
+                delete_orders(student=user.id)
             user.delete()
+            invalidate_user(user.id)
+            revoke_tokens(user.id, sessions=True)
         else:
             raise PermissionDenied()
 
@@ -50,17 +121,19 @@ class UserService(BaseService):
         if "password" in kwargs:
             kwargs["password"] = get_hashed_password(kwargs["password"])
 
-        if self.user._cls == "User.Admin" and "sys_owner" in self.user.permissions:
+        if has_permission(self.user, "sys_owner"):
             self.logger.info("Update user as sys admin")
             user = User.objects(username=username).first_or_404("User not exists")
             user.update_from_dict(**kwargs)
-        elif self.user.username == username or (
-            self.user._cls == "User.Admin" and "user_admin" in self.user.permissions
-        ):
+            self._user_updated(
+                user, revoke="permissions" in kwargs, end_sessions="password" in kwargs
+            )
+        elif self.user.username == username or has_permission(self.user, "user_admin"):
             self.logger.info("Update user as user admin or self")
             user = User.objects(username=username).first_or_404("User not exists")
             kwargs.pop("permissions", None)
             user.update_from_dict(**kwargs)
+            self._user_updated(user, end_sessions="password" in kwargs)
     
     def update_password(self, username: str, **kwargs):
         if "password" in kwargs:
@@ -69,6 +142,33 @@ class UserService(BaseService):
         if User.objects(username=username).first_or_404("User not exists"):
             user = User.objects(username=username).first_or_404("User not exists")
             user.update_from_dict(**kwargs)
+            self._user_updated(user, end_sessions="password" in kwargs)
+
+    def _user_updated(self, user: User, revoke=False, end_sessions=False):
+        invalidate_user(user.id)
+        if revoke or end_sessions:
+            # access tokens carry the old permissions; a password change also ends sessions
+            revoke_tokens(user.id, sessions=end_sessions)
+        if isinstance(user, Teacher):
+            # Course details and the catalog embed the teacher's name
+            Course.objects(teacher=user).update(inc__version=1)
+            response_cache.invalidate("courses")
+
+    def user_etag(self, user_id) -> str:
+        user = User.objects(id=user_id).only("version").as_pymongo().first()
+        if user is None:
+            raise NotFound("User not exists")
+        parts = ["user", user_id, user.get("version", 0)]
+        # a student's body embeds their enrolled courses, with signed cover URLs
+        course_ids = enrolled_course_ids(user_id)
+        if course_ids:
+            versions = {
+                course["_id"]: course.get("version", 0)
+                for course in Course.objects(id__in=course_ids).only("version").as_pymongo()
+            }
+            parts += [f"{course_id}:{versions.get(course_id)}" for course_id in sorted(course_ids)]
+            parts.append(signed_url_epoch())
+        return make_etag(*parts)
 
 
 def user_service():
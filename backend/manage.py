@@ -0,0 +1,170 @@
+"""Maintenance commands, e.g. ``python manage.py migrate-enrollments``"""
+import argparse
+import os
+import sys
+
+from app import create_app
+
+MIGRATION_BATCH_SIZE = 1000
+
+
+def _batched_pairs(cursor, array_field, make_pair):
+    batch = []
+    for document in cursor:
+        for value in document.get(array_field) or []:
+            batch.append(make_pair(document["_id"], value))
+            if len(batch) >= MIGRATION_BATCH_SIZE:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+
+def migrate_enrollments(args):
+    """Copy Course.enrolled_students / Student.enrolled_courses into the Enrollment collection"""
+    from app.course.model import Course
+    from app.enrollment.model import Enrollment
+    from app.enrollment.service import enroll
+    from app.user.model import Student
+
+    Enrollment.ensure_indexes()
+    sources = [
+        (Course, "enrolled_students", lambda course_id, student_id: (student_id, course_id)),
+        (Student, "enrolled_courses", lambda student_id, course_id: (student_id, course_id)),
+    ]
+    for document, array_field, make_pair in sources:
+        collection = document._get_collection()
+        query = {f"{array_field}.0": {"$exists": True}}
+        migrated = 0
+        cursor = collection.find(query, {array_field: True}, batch_size=MIGRATION_BATCH_SIZE)
+        for batch in _batched_pairs(cursor, array_field, make_pair):
+            enroll(batch)
+            migrated += len(batch)
+        print(f"{document.__name__}.{array_field}: {migrated} enrollments migrated")
+        if args.unset:
+            result = collection.update_many(query, {"$set": {array_field: []}})
+            print(f"{document.__name__}.{array_field}: cleared on {result.modified_count} documents")
+    print(f"Enrollment collection now holds {Enrollment.objects.count()} enrollments")
+
+
+def backfill_orders(args):
+    """Fill the campus / student / course snapshots on orders placed before they existed"""
+    from pymongo import UpdateOne
+
+    from app.course.model import Course
+    from app.order.model import Order
+    from app.order.service import COURSE_SNAPSHOT_FIELDS, STUDENT_SNAPSHOT_FIELDS, order_snapshot
+    from app.user.model import Student
+
+    query = {} if args.all else {"student_info": {"$exists": False}}
+    cursor = Order._get_collection().find(
+        query, {"student": True, "course": True}, batch_size=MIGRATION_BATCH_SIZE
+    )
+    updated = 0
+    while True:
+        orders = [order for _, order in zip(range(MIGRATION_BATCH_SIZE), cursor)]
+        if not orders:
+            break
+        students = {
+            student["_id"]: student
+            for student in Student.objects(id__in=list({order["student"] for order in orders}))
+            .only(*STUDENT_SNAPSHOT_FIELDS)
+            .as_pymongo()
+        }
+        courses = {
+            course["_id"]: course
+            for course in Course.objects(id__in=list({order["course"] for order in orders}))
+            .only(*COURSE_SNAPSHOT_FIELDS)
+            .as_pymongo()
+        }
+        updates = []
+        for order in orders:
+            student, course = students.get(order["student"]), courses.get(order["course"])
+            if student is None or course is None:
+                continue
+            snapshot = order_snapshot(student, course)
+            updates.append(
+                UpdateOne(
+                    {"_id": order["_id"]},
+                    {
+                        "$set": {
+                            "campus": snapshot["campus"],
+                            "student_info": snapshot["student_info"].to_mongo(),
+                            "course_info": snapshot["course_info"].to_mongo(),
+                        }
+                    },
+                )
+            )
+        if updates:
+            updated += Order._get_collection().bulk_write(updates, ordered=False).modified_count
+    print(f"{updated} orders backfilled")
+
+
+def rebuild_rollups(args):
+    """Recompute the order report rollups from scratch with aggregation pipelines"""
+    from app.report.service import rebuild_rollups
+
+    for dimension, count in rebuild_rollups().items():
+        print(f"{dimension}: {count} rollups")
+
+
+def ensure_indexes(args):
+    """Create all declared indexes (idempotent, built in the background)"""
+    from app.core.indexes import ensure_indexes
+
+    ensure_indexes()
+    print("Indexes ensured")
+
+
+def check_indexes(args):
+    """Fail when a representative service query is planned as a COLLSCAN"""
+    from app.core.indexes import find_collscans, index_probes
+
+    if args.ensure:
+        ensure_indexes(args)
+    probes = index_probes()
+    collscans = find_collscans(probes)
+    for name in probes:
+        print(f"{'COLLSCAN' if name in collscans else 'ok':8} {name}")
+    if collscans:
+        sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    migrate = commands.add_parser("migrate-enrollments", help=migrate_enrollments.__doc__)
+    migrate.add_argument(
+        "--unset", action="store_true", help="empty the legacy arrays after copying them"
+    )
+    migrate.set_defaults(handler=migrate_enrollments)
+
+    backfill = commands.add_parser("backfill-orders", help=backfill_orders.__doc__)
+    backfill.add_argument(
+        "--all", action="store_true", help="refresh the snapshots of every order"
+    )
+    backfill.set_defaults(handler=backfill_orders)
+
+    commands.add_parser("rebuild-rollups", help=rebuild_rollups.__doc__).set_defaults(
+        handler=rebuild_rollups
+    )
+
+    commands.add_parser("ensure-indexes", help=ensure_indexes.__doc__).set_defaults(
+        handler=ensure_indexes
+    )
+
+    check = commands.add_parser("check-indexes", help=check_indexes.__doc__)
+    check.add_argument("--ensure", action="store_true", help="ensure indexes before checking")
+    check.set_defaults(handler=check_indexes)
+
+    args = parser.parse_args()
+    # one-off commands build indexes synchronously, not in the background
+    os.environ.setdefault("FLASK_ENSURE_INDEXES_ON_BOOT", "false")
+    app = create_app()
+    with app.app_context():
+        args.handler(args)
+
+
+if __name__ == "__main__":
+    main()
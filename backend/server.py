@@ -1,5 +1,7 @@
 if __name__ == "__main__":
     from app import create_app
+    from app.core.s3_cleanup import start_s3_cleanup
 
     app = create_app()
+    start_s3_cleanup(app)
     app.run(debug=True,host="0.0.0.0",port=3000)
\ No newline at end of file
@@ -0,0 +1,80 @@
+"""p99 latency of unrelated work on the gevent hub while logins hash passwords.
+
+    python -m tests.benchmark_bcrypt [logins] [rounds]
+
+Runs ``logins`` concurrent ``check_password`` calls twice: with bcrypt
+inline on the hub, as before ``bcrypt_pool``, and through ``bcrypt_pool``,
+whose queue timeout is lifted so every login completes. Meanwhile a probe
+greenlet times a no-op greenlet every 10 ms, standing in for a request to
+an endpoint that does no hashing.
+"""
+from gevent import monkey
+
+monkey.patch_all()
+
+import base64  # noqa: E402
+import hashlib  # noqa: E402
+import sys  # noqa: E402
+import time  # noqa: E402
+
+import bcrypt  # noqa: E402
+import gevent  # noqa: E402
+from gevent.event import Event  # noqa: E402
+
+from app.core.pool import bcrypt_pool  # noqa: E402
+from app.user import model  # noqa: E402
+from app.user.model import check_password  # noqa: E402
+
+PROBE_INTERVAL = 0.01
+
+
+def inline_check_password(plain_text_password, hashed_password):
+    """``check_password`` as it was, hashing on the calling greenlet"""
+    return bcrypt.checkpw(
+        base64.b64encode(hashlib.sha256(plain_text_password.encode("utf-8")).digest()),
+        hashed_password.encode("utf-8"),
+    )
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def probe(stop, latencies):
+    while not stop.is_set():
+        started = time.perf_counter()
+        gevent.spawn(lambda: None).join()
+        latencies.append(time.perf_counter() - started)
+        gevent.sleep(PROBE_INTERVAL)
+
+
+def run(check, hashed, logins):
+    stop = Event()
+    latencies = []
+    prober = gevent.spawn(probe, stop, latencies)
+    gevent.sleep(PROBE_INTERVAL)
+    started = time.perf_counter()
+    gevent.joinall([gevent.spawn(check, "password", hashed) for _ in range(logins)], raise_error=True)
+    elapsed = time.perf_counter() - started
+    stop.set()
+    prober.join()
+    return elapsed, latencies
+
+
+def main(logins=20, rounds=model.BCRYPT_ROUNDS):
+    model.BCRYPT_ROUNDS = rounds
+    # measure queueing, not the 503s a full queue sheds
+    bcrypt_pool.configure(queue_timeout=3600)
+    hashed = model.get_hashed_password("password")
+    for name, check in (("inline", inline_check_password), ("bcrypt_pool", check_password)):
+        elapsed, latencies = run(check, hashed, logins)
+        print(
+            f"{name}: {logins} logins in {elapsed:.2f} s, no-op greenlet "
+            f"p50 {percentile(latencies, 0.5) * 1000:.1f} ms, "
+            f"p99 {percentile(latencies, 0.99) * 1000:.1f} ms, {len(latencies)} samples"
+        )
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,61 @@
+"""Time ``serialize`` against ``from_orm(...).dict()`` for the schemas it renders.
+
+    python -m tests.benchmark_convertor [repeat]
+"""
+import sys
+import timeit
+import uuid
+from datetime import datetime
+
+import app.course.schema
+import app.enrollment.service
+from app.core.convertor import serialize
+from app.course.model import Lecture, LectureAttachment
+from app.course.schema import CourseDetailSchema
+from app.order.schema import OrderListSchema
+from tests.test_convertor import make_course, make_order, reference
+
+
+def cases():
+    lectures = [
+        Lecture(
+            id=uuid.uuid4(),
+            title=f"Lecture {index}",
+            streaming_url="https://stream",
+            recording_url="https://record",
+            scheduled_at=datetime(2024, 2, 1, 9),
+            attachments=[
+                LectureAttachment(name=f"File {n}", type="pdf", filename=f"{n}.pdf", bucket_url=f"a/{n}.pdf")
+                for n in range(3)
+            ],
+        )
+        for index in range(20)
+    ]
+    orders = [make_order(paid=index % 2 == 0) for index in range(100)]
+    return [
+        ("CourseDetailSchema, 20 lectures", CourseDetailSchema, make_course(lectures=lectures)),
+        (
+            "OrderListSchema, 100 orders",
+            OrderListSchema,
+            {"total": 1000, "page": 1, "pages": 10, "limit": 100, "items": orders},
+        ),
+    ]
+
+
+def main(repeat=200):
+    # no S3 or database behind the documents
+    app.course.schema.generate_s3_signed_url = lambda key: f"signed:{key}"
+    app.enrollment.service.count_enrolled = lambda course_id: 3
+
+    for name, schema, obj in cases():
+        assert serialize(schema, obj) == reference(schema, obj)
+        baseline = min(timeit.repeat(lambda: reference(schema, obj), number=repeat, repeat=3)) / repeat
+        compiled = min(timeit.repeat(lambda: serialize(schema, obj), number=repeat, repeat=3)) / repeat
+        print(
+            f"{name}: from_orm {baseline * 1e6:.0f} us, serialize {compiled * 1e6:.0f} us, "
+            f"{baseline / compiled:.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
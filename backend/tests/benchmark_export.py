@@ -0,0 +1,90 @@
+"""Peak memory and throughput of the order export.
+
+    TEST_MONGODB_URI=mongodb://localhost:27017 python -m tests.benchmark_export [orders] [format]
+
+Seeds ``orders`` orders (1M by default) with their student and course
+snapshots, then drains ``stream_export`` over all of them, as
+``GET /orders/export`` does, without keeping the output. Peak RSS is read
+before and after the export; a flat export keeps the difference at the
+size of one batch whatever the number of orders. See tests/mongo.py for
+the database used.
+"""
+import resource
+import sys
+import time
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+from app.core.export import stream_export
+from app.order.model import Order
+from app.order.service import ORDER_EXPORT_COLUMNS
+from tests.mongo import MONGODB_URI, drop_test_db, mongo_test_app
+
+SEED_BATCH_SIZE = 10000
+STUDENTS = 1000
+COURSES = 100
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def seed_orders(count):
+    campus = ObjectId()
+    students = [ObjectId() for _ in range(STUDENTS)]
+    courses = [ObjectId() for _ in range(COURSES)]
+    started = datetime.utcnow() - timedelta(seconds=count)
+    collection = Order._get_collection()
+    for first in range(0, count, SEED_BATCH_SIZE):
+        collection.insert_many(
+            [
+                {
+                    "student": students[n % STUDENTS],
+                    "course": courses[n % COURSES],
+                    "campus": campus,
+                    "student_info": {"id": students[n % STUDENTS], "username": f"s{n % STUDENTS}"},
+                    "course_info": {"id": courses[n % COURSES], "name": f"Course {n % COURSES}"},
+                    "created_time": started + timedelta(seconds=n),
+                    "original_price": 100.0,
+                    "paid": n % 2 == 0,
+                    "paid_time": started + timedelta(seconds=n) if n % 2 == 0 else None,
+                    "paid_price": 100.0 if n % 2 == 0 else None,
+                    "paid_comment": "No comment" if n % 2 == 0 else None,
+                }
+                for n in range(first, min(first + SEED_BATCH_SIZE, count))
+            ],
+            ordered=False,
+        )
+
+
+def main(orders=1000000, export_format="csv"):
+    if not MONGODB_URI:
+        sys.exit("set TEST_MONGODB_URI to a mongod")
+    orders = int(orders)
+    flask_app = mongo_test_app()
+    try:
+        with flask_app.test_request_context():
+            flask_app.preprocess_request()
+            # the export sorts on the -created_time index
+            Order.ensure_indexes()
+            seed_orders(orders)
+            before = peak_rss_mb()
+            started = time.perf_counter()
+            response = stream_export(
+                Order.objects.order_by("-created_time"), ORDER_EXPORT_COLUMNS, export_format, "orders"
+            )
+            size = sum(len(chunk) for chunk in response.response)
+            elapsed = time.perf_counter() - started
+            print(
+                f"{export_format}: {orders} orders, {size / 2**20:.0f} MiB in {elapsed:.1f} s, "
+                f"{orders / elapsed:.0f} rows/s, peak RSS {before:.0f} MiB before and "
+                f"{peak_rss_mb():.0f} MiB after the export"
+            )
+    finally:
+        drop_test_db()
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:])
@@ -0,0 +1,118 @@
+"""Payment throughput of ``pay_order`` as it was and as it is.
+
+    TEST_MONGODB_URI=mongodb://localhost:27017 python -m tests.benchmark_payments [payments] [workers]
+
+Seeds ``payments`` unpaid orders for each run and pays them all from
+``workers`` threads: once with the old path (load, ``update``, ``reload``,
+then the two enrollment updates through the dereferenced course and
+student), once with ``OrderService.pay_order`` (one ``find_one_and_update``,
+enrollment and rollups by id). See tests/mongo.py for the database used.
+"""
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.campus.model import Campus
+from app.course.model import Course
+from app.order.model import Order
+from app.order.schema import OrderPaymentSchema
+from app.order.service import OrderService
+from app.user.model import Student, Teacher
+from tests.mongo import MONGODB_URI, drop_test_db, mongo_test_app
+
+COURSES = 10
+
+
+def legacy_pay_order(order_id, payment_info: OrderPaymentSchema):
+    """``pay_order`` before the single ``find_one_and_update``"""
+    order = Order.objects(id=order_id).first_or_404("Order not exists")
+    if payment_info.paid_price is None:
+        payment_info.paid_price = order.original_price
+    order_updated = order.update(**payment_info.dict())
+    order.reload()
+    if order.paid:
+        order.course.update(add_to_set__legacy_enrolled_students=order.student)
+        order.student.update(add_to_set__legacy_enrolled_courses=order.course)
+    return order_updated
+
+
+def seed_orders(count):
+    campus = Campus(name=f"benchmark-{time.time_ns()}").save()
+    teacher = Teacher(
+        username=f"t{time.time_ns() % 10**8}",
+        password="x",
+        display_name="Teacher",
+        telephone="1",
+        campus=campus,
+    ).save()
+    courses = [
+        Course(
+            name=f"Course {n}",
+            uni_course_code="TEST1000",
+            description="Benchmark",
+            teacher=teacher,
+            campus=campus,
+        ).save()
+        for n in range(COURSES)
+    ]
+    students = Student._get_collection().insert_many(
+        [
+            {
+                "_cls": Student._class_name,
+                "username": f"s{time.time_ns()}-{n}",
+                "password": "x",
+                "display_name": f"Student {n}",
+                "telephone": "1",
+                "campus": campus.id,
+            }
+            for n in range(count // COURSES + 1)
+        ]
+    ).inserted_ids
+    orders = Order._get_collection().insert_many(
+        [
+            {
+                "student": students[n // COURSES],
+                "course": courses[n % COURSES].id,
+                "campus": campus.id,
+                "original_price": 100.0,
+                "paid": False,
+            }
+            for n in range(count)
+        ]
+    )
+    return [str(order_id) for order_id in orders.inserted_ids]
+
+
+def run(flask_app, pay, order_ids, workers):
+    def pay_in_context(order_id):
+        with flask_app.app_context():
+            pay(order_id, OrderPaymentSchema())
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(workers) as pool:
+        list(pool.map(pay_in_context, order_ids))
+    return time.perf_counter() - started
+
+
+def main(payments=2000, workers=8):
+    if not MONGODB_URI:
+        sys.exit("set TEST_MONGODB_URI to a mongod")
+    flask_app = mongo_test_app()
+    try:
+        with flask_app.test_request_context():
+            flask_app.preprocess_request()
+            service = OrderService(None)
+            for name, pay in (("before", legacy_pay_order), ("after", service.pay_order)):
+                order_ids = seed_orders(payments)
+                elapsed = run(flask_app, pay, order_ids, workers)
+                assert Order.objects(id__in=order_ids, paid=True).count() == payments
+                print(
+                    f"{name}: {payments} payments from {workers} threads in {elapsed:.2f} s, "
+                    f"{payments / elapsed:.0f} payments/s"
+                )
+    finally:
+        drop_test_db()
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,46 @@
+"""The app against the mongod at ``TEST_MONGODB_URI``, for tests and benchmarks that need one.
+
+Credentials, if any, go in the URI. Everything is written to ``TEST_DB``,
+which the callers drop when they are done.
+"""
+import os
+from functools import lru_cache
+
+from mongoengine import get_connection
+
+from app import create_app
+
+MONGODB_URI = os.getenv("TEST_MONGODB_URI")
+TEST_DB = "booking_platform_test"
+
+
+@lru_cache(maxsize=None)
+def mongo_test_app():
+    overrides = {
+        "FLASK_MONGODB_SETTINGS__HOST": MONGODB_URI,
+        "FLASK_MONGODB_SETTINGS__DB": TEST_DB,
+        # the URI carries any credentials, not the ones from .env
+        "FLASK_MONGODB_SETTINGS__USERNAME": None,
+        "FLASK_MONGODB_SETTINGS__PASSWORD": None,
+        "FLASK_MONGODB_SETTINGS__AUTHENTICATION_SOURCE": None,
+        "FLASK_ENSURE_INDEXES_ON_BOOT": "false",
+        "FLASK_AWS_BUCKET_NAME": "test-bucket",
+    }
+    saved = {key: os.environ.get(key) for key in overrides}
+    try:
+        for key, value in overrides.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+        return create_app()
+    finally:
+        for key, value in saved.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+
+
+def drop_test_db():
+    get_connection().drop_database(TEST_DB)
@@ -0,0 +1,141 @@
+"""``serialize`` must render what ``from_orm(...).dict(exclude_defaults=True)`` renders"""
+import uuid
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+from pydantic import ValidationError
+
+from app.campus.model import Campus
+from app.core.convertor import serialize, serialize_many
+from app.course.model import Course, Lecture, LectureAttachment
+from app.course.schema import CourseBasicInfoSchema, CourseDetailSchema
+from app.order.model import Order, OrderCourseInfo, OrderStudentInfo
+from app.order.schema import OrderCursorListSchema, OrderListSchema
+from app.user.model import Teacher
+
+
+@pytest.fixture(autouse=True)
+def offline(monkeypatch):
+    # no S3 or database behind the documents
+    monkeypatch.setattr("app.course.schema.generate_s3_signed_url", lambda key: f"signed:{key}")
+    monkeypatch.setattr("app.enrollment.service.count_enrolled", lambda course_id: 3)
+
+
+def reference(schema, obj):
+    # pages are plain dicts around documents, the way paginate returns them
+    model = schema.parse_obj(obj) if isinstance(obj, dict) else schema.from_orm(obj)
+    return model.dict(exclude_defaults=True)
+
+
+def make_course(**fields):
+    values = dict(
+        id=ObjectId(),
+        name="Algorithms",
+        uni_course_code="COMP3121",
+        description="Design and analysis",
+        teacher=Teacher(id=ObjectId(), display_name="Ada"),
+        campus=Campus(id=ObjectId(), name="Sydney"),
+        created_time=datetime(2024, 1, 1, 9),
+        publish_time=datetime(2024, 1, 2, 9),
+        original_price=120,
+        cover_image="courses/cover.png",
+        lectures=[
+            Lecture(
+                id=uuid.uuid4(),
+                title="Intro",
+                streaming_url="https://stream/1",
+                recording_url="https://record/1",
+                scheduled_at=datetime(2024, 2, 1, 9),
+                attachments=[
+                    LectureAttachment(
+                        name="Slides", type="pdf", filename="slides.pdf", bucket_url="a/slides.pdf"
+                    )
+                ],
+            ),
+            Lecture(
+                id=uuid.uuid4(),
+                title="Sorting",
+                streaming_url="https://stream/2",
+                recording_url="https://record/2",
+                scheduled_at=datetime(2024, 2, 8, 9),
+            ),
+        ],
+    )
+    values.update(fields)
+    return Course(**values)
+
+
+def make_order(paid=True, campus=True, **fields):
+    student, course = ObjectId(), ObjectId()
+    values = dict(
+        id=ObjectId(),
+        student_info=OrderStudentInfo(id=student, username="s0", display_name="Student"),
+        course_info=OrderCourseInfo(id=course, name="Algorithms", teacher=ObjectId()),
+        created_time=datetime(2024, 1, 1, 9),
+        original_price=100.0,
+    )
+    if paid:
+        values.update(paid=True, paid_time=datetime(2024, 1, 3), paid_comment="cash", paid_price=90)
+    values.update(fields)
+    order = Order(**values)
+    # id-only references hold bare ids, as resolve_references leaves them
+    order._data.update(student=student, course=course, campus=ObjectId() if campus else None)
+    return order
+
+
+@pytest.mark.parametrize("schema", [CourseDetailSchema, CourseBasicInfoSchema])
+@pytest.mark.parametrize(
+    "fields",
+    [{}, {"cover_image": ""}, {"lectures": []}, {"original_price": 0.0}],
+    ids=["full", "no-cover", "no-lectures", "default-price"],
+)
+def test_course_schemas_match_from_orm(schema, fields):
+    course = make_course(**fields)
+    assert serialize(schema, course) == reference(schema, course)
+
+
+def test_course_list_matches_from_orm():
+    courses = [make_course(), make_course(cover_image="")]
+    assert serialize_many(CourseBasicInfoSchema, courses) == [
+        reference(CourseBasicInfoSchema, course) for course in courses
+    ]
+
+
+@pytest.mark.parametrize(
+    "orders",
+    [[], [make_order()], [make_order(), make_order(paid=False, campus=False)]],
+    ids=["empty", "paid", "mixed"],
+)
+def test_order_pages_match_from_orm(orders):
+    page = {"total": 12, "page": 2, "pages": 2, "limit": 10, "items": orders}
+    assert serialize(OrderListSchema, page) == reference(OrderListSchema, page)
+
+    for cursor_page in (
+        {"limit": 10, "items": orders},
+        {"limit": 10, "items": orders, "next_cursor": "abc", "total": 12},
+    ):
+        assert serialize(OrderCursorListSchema, cursor_page) == reference(
+            OrderCursorListSchema, cursor_page
+        )
+
+
+@pytest.mark.parametrize(
+    "schema, obj",
+    [
+        (CourseDetailSchema, make_course(name=None)),
+        (CourseDetailSchema, make_course(uni_course_code=None, description=None)),
+        (CourseBasicInfoSchema, make_course(teacher=None)),
+        (OrderListSchema, {"total": 1, "page": 1, "pages": 1, "items": []}),
+        (OrderListSchema, {"total": 1, "page": 1, "pages": 1, "limit": 10, "items": None}),
+    ],
+    ids=["none-name", "none-code-and-description", "none-teacher", "missing-limit", "none-items"],
+)
+def test_missing_required_fields_fail_like_from_orm(schema, obj):
+    with pytest.raises(ValidationError) as expected:
+        reference(schema, obj)
+    with pytest.raises(ValidationError) as actual:
+        serialize(schema, obj)
+    assert [error["loc"] for error in actual.value.errors()] == [
+        error["loc"] for error in expected.value.errors()
+    ]
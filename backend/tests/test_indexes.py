@@ -0,0 +1,25 @@
+"""Every query in ``index_probes`` is served by an index once ``ensure_indexes`` ran.
+
+``explain()`` needs a real mongod, so the test only runs when
+``TEST_MONGODB_URI`` points at one, e.g.
+
+    TEST_MONGODB_URI=mongodb://localhost:27017 python -m pytest tests/test_indexes.py
+"""
+import pytest
+
+from app.core.indexes import ensure_indexes, find_collscans
+from tests.mongo import MONGODB_URI, drop_test_db, mongo_test_app
+
+pytestmark = pytest.mark.skipif(not MONGODB_URI, reason="set TEST_MONGODB_URI to a mongod")
+
+
+@pytest.fixture(scope="module")
+def flask_app():
+    yield mongo_test_app()
+    drop_test_db()
+
+
+def test_probes_use_indexes(flask_app):
+    with flask_app.app_context():
+        ensure_indexes()
+        assert find_collscans() == []
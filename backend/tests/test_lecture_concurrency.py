@@ -0,0 +1,168 @@
+"""Parallel lecture edits must all land; each one is a single atomic update.
+
+The nested positional ``$push``/``$pull`` updates need a real mongod, so the
+tests only run when ``TEST_MONGODB_URI`` points at one, e.g.
+
+    TEST_MONGODB_URI=mongodb://localhost:27017 python -m pytest tests/test_lecture_concurrency.py
+
+See tests/mongo.py for the database the tests use.
+"""
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from io import BytesIO
+
+import pytest
+from werkzeug.datastructures import FileStorage
+from werkzeug.utils import secure_filename
+
+from app.campus.model import Campus
+from app.core.s3_cleanup import PendingS3Deletion
+from app.course.model import Course, Lecture, LectureAttachment
+from app.course.schema import LectureCreateSchema, LecturePutSchema
+from app.course.service import CourseService
+from app.user.model import Teacher
+from tests.mongo import MONGODB_URI, drop_test_db, mongo_test_app
+
+WORKERS = 16
+
+pytestmark = pytest.mark.skipif(not MONGODB_URI, reason="set TEST_MONGODB_URI to a mongod")
+
+
+@pytest.fixture(scope="module")
+def flask_app():
+    yield mongo_test_app()
+    drop_test_db()
+
+
+@pytest.fixture
+def service(flask_app, monkeypatch):
+    # S3 is not under test; uploads only need a key
+    monkeypatch.setattr(
+        "app.course.service.upload_file_to_s3",
+        lambda file, path: f"{path}/{secure_filename(file.filename)}",
+    )
+    with flask_app.test_request_context():
+        flask_app.preprocess_request()
+        yield CourseService(None)
+
+
+def run_parallel(flask_app, calls):
+    """Run every ``(func, *args)`` at once, each in its own app context"""
+
+    def run(call):
+        func, *args = call
+        with flask_app.app_context():
+            return func(*args)
+
+    with ThreadPoolExecutor(WORKERS) as pool:
+        return list(pool.map(run, calls))
+
+
+def make_course(lectures=()):
+    campus = Campus(name=f"campus-{uuid.uuid4().hex}").save()
+    teacher = Teacher(
+        username=f"t{uuid.uuid4().hex[:8]}",
+        password="x",
+        display_name="Teacher",
+        telephone="1",
+        campus=campus,
+    ).save()
+    return Course(
+        name="Concurrency",
+        uni_course_code="TEST1000",
+        description="Parallel edits",
+        teacher=teacher,
+        campus=campus,
+        lectures=list(lectures),
+    ).save()
+
+
+def make_lecture(index, attachments=0):
+    lecture_id = uuid.uuid4()
+    return Lecture(
+        id=lecture_id,
+        title=f"Lecture {index}",
+        streaming_url="https://stream",
+        recording_url="https://record",
+        scheduled_at=datetime(2024, 1, 1),
+        attachments=[
+            LectureAttachment(
+                name=f"old-{n}",
+                type="pdf",
+                filename=f"old-{n}.pdf",
+                bucket_url=f"lectures/{lecture_id}/old-{n}.pdf",
+            )
+            for n in range(attachments)
+        ],
+    )
+
+
+def new_lecture(index):
+    return LectureCreateSchema(
+        title=f"Added {index}",
+        streaming_url="https://stream",
+        recording_url="https://record",
+        scheduled_at=datetime(2024, 1, 1),
+    )
+
+
+def test_parallel_lecture_adds_all_land(flask_app, service):
+    course = make_course()
+    ids = run_parallel(
+        flask_app, [(service.add_lecture, str(course.id), new_lecture(n)) for n in range(40)]
+    )
+
+    course.reload()
+    assert sorted(str(lecture.id) for lecture in course.lectures) == sorted(ids)
+    assert course.version == 40
+
+
+def test_parallel_edits_of_one_course_all_land(flask_app, service):
+    lectures = [make_lecture(n, attachments=4) for n in range(5)]
+    removed = make_lecture(99, attachments=0)
+    course = make_course([*lectures, removed])
+    course_id = str(course.id)
+
+    calls = [(service.delete_lecture, course_id, str(removed.id))]
+    calls += [(service.add_lecture, course_id, new_lecture(n)) for n in range(5)]
+    for lecture in lectures:
+        lecture_id = str(lecture.id)
+        calls.append(
+            (service.update_lecture, course_id, lecture_id, LecturePutSchema(title=f"Renamed {lecture_id}"))
+        )
+        calls += [
+            (
+                service.upload_lecture_attachment,
+                course_id,
+                lecture_id,
+                FileStorage(BytesIO(b"data"), filename=f"new-{n}.pdf"),
+                "pdf",
+                None,
+            )
+            for n in range(4)
+        ]
+        calls += [(service.delete_attachment, course_id, lecture_id, f"old-{n}.pdf") for n in range(2)]
+    run_parallel(flask_app, calls)
+
+    course.reload()
+    assert course.version == len(calls)
+    assert removed.id not in {lecture.id for lecture in course.lectures}
+    assert sorted(lecture.title for lecture in course.lectures if lecture.title.startswith("Added")) == [
+        f"Added {n}" for n in range(5)
+    ]
+    by_id = {lecture.id: lecture for lecture in course.lectures}
+    for lecture in lectures:
+        stored = by_id[lecture.id]
+        assert stored.title == f"Renamed {lecture.id}"
+        assert sorted(attachment.filename for attachment in stored.attachments) == [
+            "new-0.pdf", "new-1.pdf", "new-2.pdf", "new-3.pdf", "old-2.pdf", "old-3.pdf"
+        ]
+        # every upload got its own key
+        assert len({attachment.bucket_url for attachment in stored.attachments}) == 6
+
+    # exactly the pulled attachments are handed to the S3 cleanup worker
+    scheduled = {pending.key for pending in PendingS3Deletion.objects(key__startswith="lectures/")}
+    assert scheduled == {
+        f"lectures/{lecture.id}/old-{n}.pdf" for lecture in lectures for n in range(2)
+    }
@@ -0,0 +1,47 @@
+"""A cursor only resumes a page with a value of the sort field's type and an ObjectId"""
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+from werkzeug.exceptions import BadRequest
+
+from app.core.page import cursor_value_type, decode_cursor, encode_cursor
+from app.order.model import Order
+from app.user.model import User
+
+
+def test_cursor_round_trip():
+    created_time, object_id = datetime(2024, 1, 1, 9), ObjectId()
+    value, decoded_id = decode_cursor(
+        encode_cursor("-created_time", created_time, object_id), "-created_time", datetime
+    )
+    assert value.replace(tzinfo=None) == created_time
+    assert decoded_id == object_id
+
+
+def test_value_type_follows_the_sort_field():
+    assert cursor_value_type(Order._fields["created_time"]) is datetime
+    assert cursor_value_type(User._fields["username"]) is str
+    with pytest.raises(TypeError):
+        cursor_value_type(Order._fields["paid"])
+
+
+@pytest.mark.parametrize(
+    "value, object_id",
+    [
+        ({"$ne": None}, ObjectId()),
+        ("2024-01-01", ObjectId()),
+        (None, ObjectId()),
+        (datetime(2024, 1, 1), str(ObjectId())),
+        (datetime(2024, 1, 1), {"$gt": ""}),
+    ],
+)
+def test_cursor_with_other_types_is_rejected(value, object_id):
+    with pytest.raises(BadRequest):
+        decode_cursor(encode_cursor("created_time", value, object_id), "created_time", datetime)
+
+
+@pytest.mark.parametrize("cursor", ["not base64!", "bm90IGpzb24=", encode_cursor("username", "a", ObjectId())])
+def test_malformed_or_foreign_cursor_is_rejected(cursor):
+    with pytest.raises(BadRequest):
+        decode_cursor(cursor, "created_time", datetime)
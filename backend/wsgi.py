@@ -1,3 +1,5 @@
 from app import create_app
+from app.core.s3_cleanup import start_s3_cleanup
 
 app=create_app()
+start_s3_cleanup(app)
@@ -1,5 +1,6 @@
 import { useAxios } from "@vueuse/integrations/useAxios";
-import type { AxiosProgressEvent } from "axios";
+import rawAxios, { type AxiosProgressEvent } from "axios";
+import type { PaginatedResponse } from "@/interfaces/api.interface";
 import axios from "../utils/http";
 
 export interface CourseBasicInfo {
@@ -27,7 +28,7 @@ export interface Course {
   original_price: number;
   cover_image: string;
   lectures: Lecture[];
-  enrolled_students: EnrolledStudent[];
+  enrolled_count: number;
 }
 
 export interface Teacher {
@@ -72,6 +73,19 @@ export interface CreateLectureData {
 export const useCourse = (course_id: string) =>
   useAxios<Course>(`/courses/${course_id}`, axios);
 
+export interface CourseStudent {
+  student: EnrolledStudent;
+  created_time: string;
+}
+
+export const getCourseStudents = async (course_id: string, page = 1) =>
+  (
+    await axios.get<PaginatedResponse<CourseStudent>>(
+      `/courses/${course_id}/students`,
+      { params: { page } }
+    )
+  ).data;
+
 export const useCourseList = () =>
   useAxios<CourseBasicInfo[]>(`/courses`, axios);
 
@@ -100,6 +114,16 @@ export const createLecture = async (
     await axios.post<String>(`/courses/${course_id}/lectures`, data)
   ).data;
 
+interface PresignedUpload {
+  object_name: string;
+  method: "POST" | "PUT";
+  url?: string;
+  fields?: Record<string, string>;
+  upload_id?: string;
+  part_size?: number;
+  parts?: { part_number: number; url: string }[];
+}
+
 export const uploadAttachment = async (
   courseId: string,
   lectureId: string,
@@ -108,16 +132,51 @@ export const uploadAttachment = async (
   type: string,
   onUploadProgress: (progressEvent: AxiosProgressEvent) => void
 ) => {
-  const form = new FormData();
-  form.append("file", file);
-  form.append("name", name);
-  form.append("type", type);
-  const reposne = await axios.post(
-    `/courses/${courseId}/lectures/${lectureId}/attachments`,
-    form,
-    {
-      onUploadProgress,
+  const uploadsUrl = `/courses/${courseId}/lectures/${lectureId}/attachments/uploads`;
+  const upload = (
+    await axios.post<PresignedUpload>(uploadsUrl, {
+      filename: file.name,
+      content_type: file.type || "application/octet-stream",
+      size: file.size,
+    })
+  ).data;
+
+  // the file goes straight to S3; only the small completion call hits the API
+  const parts: { part_number: number; etag: string }[] = [];
+  if (upload.method === "POST") {
+    const form = new FormData();
+    Object.entries(upload.fields || {}).forEach(([key, value]) =>
+      form.append(key, value)
+    );
+    form.append("file", file);
+    await rawAxios.post(upload.url!, form, { onUploadProgress });
+  } else {
+    const partSize = upload.part_size!;
+    for (const part of upload.parts || []) {
+      const start = (part.part_number - 1) * partSize;
+      const response = await rawAxios.put(
+        part.url,
+        file.slice(start, start + partSize),
+        {
+          onUploadProgress: (event) =>
+            onUploadProgress({
+              ...event,
+              loaded: start + event.loaded,
+              total: file.size,
+            }),
+        }
+      );
+      parts.push({ part_number: part.part_number, etag: response.headers.etag });
     }
-  );
+  }
+
+  const reposne = await axios.post(`${uploadsUrl}/complete`, {
+    filename: file.name,
+    name,
+    type,
+    object_name: upload.object_name,
+    upload_id: upload.upload_id,
+    parts,
+  });
   return reposne.data;
 };
@@ -1,4 +1,8 @@
-import axios, { AxiosError, type AxiosRequestHeaders } from "axios";
+import axios, {
+  AxiosError,
+  type AxiosRequestConfig,
+  type AxiosRequestHeaders,
+} from "axios";
 import { useCookies } from "@vueuse/integrations/useCookies";
 import { useAuthStore } from "@/stores/auth";
 import router from "@/router";
@@ -8,14 +12,46 @@ interface Headers extends AxiosRequestHeaders {
   "X-CSRF-TOKEN": string;
 }
 
+interface RetryConfig extends AxiosRequestConfig {
+  _refreshes?: number;
+}
+
 const CSRF_ACCESS_TOKEN = "csrf_access_token";
-const cookies = useCookies([CSRF_ACCESS_TOKEN]);
+const CSRF_REFRESH_TOKEN = "csrf_refresh_token";
+const AUTH_PATHS = ["auth/login", "auth/refresh"];
+// a revocation can land right after a refresh; only a failing refresh logs out
+const MAX_REFRESHES = 2;
+const cookies = useCookies([CSRF_ACCESS_TOKEN, CSRF_REFRESH_TOKEN]);
 
 const axiosInstance = axios.create({
   timeout: 10000,
   baseURL: import.meta.env.VITE_API_BASE,
 });
 
+// Access tokens are short lived; concurrent 401s share one refresh call
+let refreshing: Promise<unknown> | null = null;
+
+const refreshAccessToken = () => {
+  if (refreshing === null) {
+    refreshing = axios
+      .post("auth/refresh", null, {
+        timeout: 10000,
+        baseURL: import.meta.env.VITE_API_BASE,
+        withCredentials: true,
+        headers: {
+          "X-CSRF-TOKEN": cookies.get<string>(CSRF_REFRESH_TOKEN),
+        },
+      })
+      .finally(() => {
+        refreshing = null;
+      });
+  }
+  return refreshing;
+};
+
+const isAuthRequest = (config?: AxiosRequestConfig) =>
+  AUTH_PATHS.some((path) => config?.url?.includes(path));
+
 axiosInstance.interceptors.request.use((config) => {
   config.withCredentials = true;
   const token = cookies.get<String>(CSRF_ACCESS_TOKEN);
@@ -31,11 +67,22 @@ axiosInstance.interceptors.response.use(
   (response) => {
     return response;
   },
-  (error) => {
+  async (error) => {
     const message = (window as any).$message as MessageApiInjection;
     if (error instanceof AxiosError && error.response) {
       switch (error.response.status) {
-        case 401:
+        case 401: {
+          const config = error.config as RetryConfig | undefined;
+          const refreshes = config?._refreshes ?? 0;
+          if (config && refreshes < MAX_REFRESHES && !isAuthRequest(config)) {
+            config._refreshes = refreshes + 1;
+            try {
+              await refreshAccessToken();
+              return axiosInstance(config);
+            } catch {
+              // the refresh token expired or was revoked: log in again
+            }
+          }
           if (router.currentRoute.value.name !== "login") {
             const authStore = useAuthStore();
             authStore.logout();
@@ -49,6 +96,7 @@ axiosInstance.interceptors.response.use(
             message.error(error.response.data["message"] || "Unauthorized");
           }
           break;
+        }
         default:
           message.error(error.response.data.message || "Unkown Error");
       }